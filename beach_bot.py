@@ -5,20 +5,38 @@ from discord.ext import commands, tasks
 from discord import app_commands
 
 # standard library
+import asyncio
 from typing import Literal
-from datetime import datetime, timedelta, time
-import pickle
+from datetime import time
+from zoneinfo import ZoneInfo
 
 # My modules
+import cards
+import data
 import img_getter
-from spots import Spot, SPOTS
+import metrics
+from replies import REPLIES
+from spots import Spot, SPOTS, INDEX, MAX_SUGGESTIONS
+from tide_store import DataRefresher, TideStore
 from weather import get_weather
-from weather import weather_codes
-from image_generation.pill import create_image
+from weather.cache import WEATHER, Forecast
+from image_generation.renderer import RENDERER
+from image_generation.render_cache import RENDER_CACHE
+from image_generation.encoder import ENCODER
 
 ###### CONSTANTS        ##########################################################
 TOKEN_FILE = '.bot.token'
-DATA = []
+REFRESH_MINUTES = 30                        # how often to look for newly scraped data
+REFRESHER = DataRefresher(today=cards.local_today)
+TIMEZONE = ZoneInfo(data.timezone.zone)     # the beaches' local time - the warm-up runs at their midnight
+MARKER_TIMES = [time(m // 60, m % 60) for m in range(0, 24 * 60, RENDER_CACHE.marker_minutes)]     # when today's cards change
+
+# Gauges read whenever the metrics endpoint is scraped
+metrics.REGISTRY.gauge('renderer_queue_depth', 'Cards waiting for a render worker', lambda: RENDERER.stats['queue_depth'])
+metrics.REGISTRY.gauge('renderer_in_flight', 'Cards being rendered', lambda: RENDERER.stats['in_flight'])
+metrics.REGISTRY.gauge('render_cache_hit_rate', 'Share of card requests served without a new render', lambda: RENDER_CACHE.hit_rate())
+metrics.REGISTRY.gauge('tide_data_load_seconds', 'How long the last tidal data load took', lambda: REFRESHER.load_seconds or 0)
+metrics.REGISTRY.gauge('tide_data_tides', 'Tides loaded', lambda: len(REFRESHER.store))
 
 
 ###### DISCORD STUFF  ############################################################
@@ -30,13 +48,32 @@ class Bot(commands.Bot):
 
     # on_ready event l think
     async def setup_hook(self) -> None:
+        # the render workers first, while the bot has no other threads yet
+        RENDERER.start()
+
         await self.tree.sync(guild=discord.Object(id=349267379991347200))
         print(f'Synced slash commands for {self.user} @ server 349267379991347200')
+
+        # local Prometheus endpoint - optional, so the bot still starts without it
+        try:
+            self.metrics_server = await metrics.start_server()
+        except OSError as e:
+            self.metrics_server = None
+            print(f'Couldn\'t serve metrics on {metrics.HOST}:{metrics.PORT}, carrying on without them: {e}')
     
     # error handling
     async def on_command_error(self, ctx, error) -> None:
         await ctx.reply(error, ephemeral=True)
 
+    # closing the pooled weatherapi connections and the render workers on shutdown
+    async def close(self) -> None:
+        await get_weather.CLIENT.close()
+        await img_getter.SEARCH.close()
+        if getattr(self, 'metrics_server', None):
+            await self.metrics_server.cleanup()
+        RENDERER.shutdown()
+        await super().close()
+
 bot = Bot()
 
 
@@ -47,36 +84,69 @@ async def on_ready():
     print("Ready to hang loose dude!")
     print(bot.user.name)
 
-    # Get current month and year as 0724
-    current_date = datetime.now()
-    f_date = current_date.strftime("%m%y")
+    # Read the tidal data of all spots for this and next month, and keep it fresh
+    await REFRESHER.refresh(force=True)
+    if not refresh_data.is_running():
+        refresh_data.start()
 
-    global DATA
+    # Pre-render every card now and every midnight, a spot's again whenever its weather changes,
+    # and today's again whenever their time marker moves
+    if not warm_up.is_running():
+        warm_up.start()
+    if not warm_today.is_running():
+        warm_today.start()
+    asyncio.create_task(warm_up())
 
-    # Read the tidal data from all pickle files
-    for i in range(0, 6):
-        with open(f'data/tides_{f_date}_{i}.pickle', 'rb') as file:
-            DATA.append(pickle.load(file))
-
-    # global DATA
-    # with open('data.pkl', 'rb') as file:
-    #     DATA = pickle.load(file)
+    # Find the embed pictures of every spot in the background
+    names = [s.name for s in SPOTS]
+    asyncio.create_task(img_getter.THUMBS.warm(names))
+    asyncio.create_task(img_getter.IMAGES.warm(names))
 
     await bot.change_presence(activity=discord.Game("🌊 Surfin' the waves 🏖️"))
 
 
+###### TASKS           #######################################################
+### Reloading the tidal data when the scraper has saved new files
+@tasks.loop(minutes=REFRESH_MINUTES)
+async def refresh_data():
+    await REFRESHER.refresh()
+
+# Rebuilding the text replies (in a worker thread) whenever new data is swapped in
+async def rebuild_replies(store: TideStore) -> None:
+    built = await REPLIES.rebuild(store)
+    print(f'Rebuilt {built} text replies')
+
+REFRESHER.on_refresh(rebuild_replies)
+
+### Pre-rendering the day's cards - and moving on to the next month's data at month rollover
+@tasks.loop(time=time(0, 0, tzinfo=TIMEZONE))
+async def warm_up():
+    # a new day needs new replies even if the data didn't change
+    if not await REFRESHER.refresh():
+        await rebuild_replies(REFRESHER.store)
+
+    rendered = await cards.prerender(REFRESHER.store)
+    print(f'Pre-rendered {rendered} tide cards')
+
+### Pre-rendering today's cards each time their time marker moves on, for the spots with a forecast at hand
+@tasks.loop(time=MARKER_TIMES)
+async def warm_today():
+    await cards.prerender(REFRESHER.store, periods=('today',), fetch=False)
+
+# Re-rendering a spot's cards whenever it gets a new forecast, since the weather is drawn on them
+async def rerender_cards(city: tuple[float, float], forecast: Forecast) -> None:
+    for spot in SPOTS:
+        if spot.coordinates == city:
+            # in the background - the weather cache waits on its listeners before handing out the forecast
+            asyncio.create_task(cards.warm_spot(REFRESHER.store, spot))
+
+WEATHER.on_update(rerender_cards)
+
+
 ###### COMMANDS        #######################################################
 ### /concerts
 @bot.hybrid_command(name = 'tides', description = 'Check out all the tidal information in your local beach!')
 @app_commands.describe(spot = 'Which beach, dude? 🤙')
-@app_commands.choices(spot=[
-    app_commands.Choice(name='São Pedro de Moel', value='0'),
-    app_commands.Choice(name='Nazaré', value='1'),
-    app_commands.Choice(name='Peniche', value='2'),
-    app_commands.Choice(name='Ericeira', value='3'),
-    app_commands.Choice(name='Cascais', value='4'),
-    app_commands.Choice(name='Comporta', value='5'),
-])
 @app_commands.describe(time_period = 'Check for tides how far out? 🏄')
 @app_commands.choices(time_period=[
     app_commands.Choice(name='today', value='today'),
@@ -84,70 +154,50 @@ async def on_ready():
     app_commands.Choice(name='weekly', value='weekly'),
 ])
 @app_commands.guilds(discord.Object(id=349267379991347200))
-async def tides(ctx, spot:app_commands.Choice[str], time_period:app_commands.Choice[str], type: Literal['image', 'message', 'embed']) -> None:
+async def tides(ctx, spot:str, time_period:app_commands.Choice[str], type: Literal['image', 'message', 'embed']) -> None:
     '''
     Displays tidal information for the requested period of time.
     '''
-    print(f'>>> Requesting tides at {spot.name} for {time_period.value} by [{ctx.author.name}]')
+    # the id of the picked suggestion, or a name typed by hand
+    spot_object = INDEX.resolve(spot)
+    if spot_object is None and not spot.strip():
+        await ctx.reply("Which beach, dude? 🤔", ephemeral=True)
+        return
+
+    if spot_object is None:
+        suggestions = INDEX.search(spot, MAX_SUGGESTIONS)
+        did_you_mean = f" Did you mean {', '.join(f'**{s.name}**' for s in suggestions)}?" if suggestions else ''
+        await ctx.reply(f"Never heard of a beach called {spot}, dude 🤔{did_you_mean}", ephemeral=True)
+        return
+
+    print(f'>>> Requesting tides at {spot_object.name} for {time_period.value} by [{ctx.author.name}]')
+
+    # everything measured from here on is tagged with this request
+    metrics.set_labels(spot=spot_object.name, period=time_period.value, type=type)
+    metrics.REQUESTS.inc()
+
+    # one snapshot of the data for the whole command, even if a refresh swaps it in the meantime
+    store = REFRESHER.store
 
     # get dates
-    today = datetime.today().date()
-    tomorrow = today + timedelta(days=1)
-
-    # init vars
-    days = []
-    msg = ''
-    data = DATA[int(spot.value)]
-    spot_object = SPOTS[int(spot.value)]
-
-    # get data
-    match time_period.value:
-        case 'today':
-            days = [d for d in data if (d.datetime == today)]
-            msg = f'Here are the tides at __{spot.name}__ today, dude 😎\n'
-
-        case 'tomorrow':
-            days = [d for d in data if (d.datetime == tomorrow)]
-            msg = f'This is what the waves are gonna look like __tomorrow at {spot.name}__, dude 🤙\n'
-
-        case 'weekly':
-            days = [d for d in data if (d.datetime - today).days <= 7]
-            msg = 'Look at all those waves, bro 🌊\n'
-
-        case _:
-            days = [d for d in data if (d.datetime == today)]
-            msg = 'Here are the tides today\n'
-    
-    for d in days:
-        formatted_date = d.datetime.strftime("%-d/%-m")
-        msg += f"\n**__{d.weekday}__**__ ({formatted_date}):__\n"
+    today = cards.local_today()
 
-        for t in d.tides:
-            icon = '🌊' if t.tide == True else '🏖️'
-            bold = '**' if t.tide == False else ''
-            msg += f"{icon}  {bold}{t.time}{bold}  ({t.height})\n"
+    # get data - the formatted tides are ready-made in the reply cache
+    with metrics.stage('lookup'):
+        days, msg = REPLIES.tides(store, spot_object, time_period.value, today)
 
+    # nothing scraped for these dates (yet)
+    if not days:
+        await ctx.reply(f"No tide data for {spot_object.name} {time_period.value} yet, dude 😕 Try again later", ephemeral=True)
+        return
 
     # Add extra information if not weekly
     if time_period.value != 'weekly':
-        # information for today
-        if time_period.value == 'today':
-            print('TODAY')
-            temp, wwo_code = get_weather.current_weather(spot_object.coordinates)
-            print(wwo_code)
-            full_date = f"TODAY | {today.strftime('%-d %B')}"
-            text = '\n\nCurrent weather:'
-
-        # information for tomorrow
-        elif time_period.value == 'tomorrow':
-            temp, wwo_code = get_weather.tomorrow_weather(spot_object.coordinates)
-            full_date = f"TOMORROW | {tomorrow.strftime('%-d %B')}"
-            text = '\n\nWeather forecast:'
-
-        # formatting data
-        conditions = weather_codes.WWO_CODE[wwo_code]
-        weather_icon = weather_codes.WEATHER_SYMBOL[conditions]
-        msg += f'{text} **{temp}ºC** // {conditions} {weather_icon}'
+        # current weather for today, forecast for tomorrow
+        with metrics.stage('weather'):
+            temp, wwo_code, weather_line = await REPLIES.weather(spot_object, time_period.value)
+
+        msg += weather_line
     
     # log print
     print(msg)
@@ -155,42 +205,52 @@ async def tides(ctx, spot:app_commands.Choice[str], time_period:app_commands.Cho
     # Check for return type
     # Normal message
     if type == 'message' and time_period.value != 'weekly':
-        await ctx.reply(msg)
+        with metrics.stage('send'):
+            await ctx.reply(msg)
         # return
     
     # Generate Image
     if type == 'image' and time_period.value != 'weekly':
-        # get tides occuring during the day        
-        high_tide, low_tide = days[0].daytime_tides()
-
-        image = create_image(
-            full_date,
-            spot.name,
-            { 'time' : high_tide.datetime, 'height' : high_tide.height[:-1] },
-            { 'time' : low_tide.datetime, 'height' : low_tide.height[:-1] },
-            temp if temp else None,
-            wwo_code,
-            time_period.value == 'today',
-            True
-        )
+        # served from the render cache, or drawn in the render pool so the event loop stays free
+        with metrics.stage('image'):
+            image = await cards.render_card(spot_object, days[0], time_period.value, temp, wwo_code)
         image.seek(0)
         
-        await ctx.send(file=discord.File(image, 'tide_report.png'))
+        with metrics.stage('send'):
+            await ctx.send(file=discord.File(image, f'tide_report.{ENCODER.extension}'))
+
+    # Generate the weekly chart
+    elif type == 'image':
+        with metrics.stage('image'):
+            image = await cards.render_chart(spot_object, store, days, time_period.value)
+        image.seek(0)
+
+        with metrics.stage('send'):
+            await ctx.send(file=discord.File(image, f'tide_chart.{ENCODER.extension}'))
     
     # Send embed
     else:
         # format data fetched as an embed
         embed = discord.Embed(
-            title=f'{spot.name}',
+            title=f'{spot_object.name}',
             description=msg,
             colour=0x2596be,
             url=spot_object.url
         )
-        embed.set_thumbnail(url=img_getter.get_thumb(spot.name))
-        embed.set_image(url=img_getter.get_img(spot.name))
+        # picked from the pools of pictures, only searching if this spot has none yet
+        with metrics.stage('image_search'):
+            thumb_url, image_url = await asyncio.gather(img_getter.THUMBS.get(spot_object.name), img_getter.IMAGES.get(spot_object.name))
+        embed.set_thumbnail(url=thumb_url)
+        embed.set_image(url=image_url)
 
         # send the embed
-        await ctx.send(embed = embed)
+        with metrics.stage('send'):
+            await ctx.send(embed = embed)
+
+### Suggesting beaches as the spot is typed
+@tides.autocomplete('spot')
+async def spot_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    return [app_commands.Choice(name=s.name, value=str(s.id)) for s in INDEX.search(current)]
 
 ###### RUNNING THE BOT #################################################
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+# Compares the tide card encoder presets: encode time and upload size of a full and a compact card
+
+### IMPORTS
+from datetime import time
+
+from image_generation.pill import create_base, draw_overlay
+from image_generation.encoder import PRESETS
+from weather import weather_codes
+from benchmarks.common import bench, print_table
+
+
+# Draws a card canvas without encoding it
+def sample_canvas(compact: bool):
+    accent = weather_codes.ACCENT_COLOUR[weather_codes.WWO_CODE['116']]
+    canvas = create_base(
+        'TODAY | 8 July',
+        'São Pedro de Moel',
+        (time(17, 35), '3.5'),
+        (time(11, 8), '0.9'),
+        accent,
+        compact
+    ).copy()
+    draw_overlay(canvas, 22, '116', True, compact, time(13, 0))
+
+    return canvas
+
+def main() -> None:
+    rows = []
+
+    for compact in (False, True):
+        canvas = sample_canvas(compact)
+
+        for name, encoder in PRESETS.items():
+            size = len(encoder.encode(canvas).getvalue())
+            result = bench(lambda: encoder.encode(canvas), repeat=3)
+
+            rows.append({
+                'card':     'compact' if compact else 'full',
+                'encoder':  name,
+                'encode_ms': result['mean_ms'],
+                'kB':       size / 1024,
+            })
+
+    print_table('Tide card encoders', rows)
+
+
+if __name__ == '__main__':
+    main()
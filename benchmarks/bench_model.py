@@ -0,0 +1,95 @@
+# Compares the slotted, pre-parsed Tide / Day model with the original string-based one
+
+### IMPORTS
+import pickle
+import tracemalloc
+from datetime import datetime, time
+from typing import List
+
+import data
+from benchmarks.common import bench, print_table
+
+### CONSTANTS
+PICKLE = 'data/tides_0824_1.pickle'
+
+
+### The model as it was before slots - strptime on every Day and on every daytime_tides call
+class LegacyTide:
+    def __init__(self, tide: bool, time: str, height: str) -> None:
+        self.tide = tide
+        self.time = time
+        self.height = height
+
+    @property
+    def datetime(self) -> time:
+        return datetime.strptime(self.time, "%H:%M").time()
+
+class LegacyDay:
+    def __init__(self, date: str, weekday: str, tides: List[LegacyTide]) -> None:
+        self.date = date
+        self.weekday = weekday
+        self.tides = tides
+        self.datetime = data.timezone.localize(datetime.strptime(date, "%d/%m/%Y")).date()
+
+    def daytime_tides(self):
+        start_time = time(9,0)
+        end_time = time(21,0)
+        tides = []
+
+        for t in self.tides:
+            tide_time = datetime.strptime(t.time, "%H:%M").time()
+
+            if start_time <= tide_time <= end_time:
+                tides.append(t)
+
+        high_tide = next((t for t in tides if t.tide), None)
+        low_tide = next((t for t in tides if not t.tide), None)
+
+        return (high_tide, low_tide)
+
+
+# Raw (date, weekday, [(tide, time, height)]) rows, like the scraper extracts them
+def raw_rows() -> list:
+    with open(PICKLE, 'rb') as file:
+        days = pickle.load(file)
+
+    return [(d.date, d.weekday, [(t.tide, t.time, t.height) for t in d.tides]) for d in days]
+
+def build(rows: list, tide_cls, day_cls) -> list:
+    return [day_cls(date, weekday, [tide_cls(*t) for t in tides]) for date, weekday, tides in rows]
+
+# Bytes allocated to build the month of days
+def memory(rows: list, tide_cls, day_cls) -> int:
+    tracemalloc.start()
+    days = build(rows, tide_cls, day_cls)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del days
+    return size
+
+def main() -> None:
+    rows = raw_rows()
+    models = {
+        'legacy':   (LegacyTide, LegacyDay),
+        'slotted':  (data.Tide, data.Day),
+    }
+
+    # both models must pick the same daytime tides
+    legacy_days, days = build(rows, *models['legacy']), build(rows, *models['slotted'])
+    for a, b in zip(legacy_days, days):
+        assert [(t.time, t.height) if t else None for t in a.daytime_tides()] == [(t.time, t.height) if t else None for t in b.daytime_tides()], a.date
+
+    results = []
+    for name, (tide_cls, day_cls) in models.items():
+        month = build(rows, tide_cls, day_cls)
+
+        results.append({'model': name, 'op': 'build month', **bench(lambda: build(rows, tide_cls, day_cls)), 'bytes': memory(rows, tide_cls, day_cls)})
+        results.append({'model': name, 'op': 'daytime_tides', **bench(lambda: [d.daytime_tides() for d in month]), 'bytes': ''})
+        results.append({'model': name, 'op': 'pickle round trip', **bench(lambda: pickle.loads(pickle.dumps(month))), 'bytes': len(pickle.dumps(month))})
+
+    print_table(f'Tide / Day model - {len(rows)} days', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# Compares the BeautifulSoup and lxml parsers of the wisuki.com tide table on the saved offline pages
+
+### IMPORTS
+import glob
+
+import tidal_scraper
+from benchmarks.common import FIXTURES_DIR, bench, print_table
+
+
+def check_identical(source: str) -> int:
+    '''
+    Makes sure both parsers extract exactly the same days from a page.
+
+    Returns:
+        The number of days found
+    '''
+    bs4_days = tidal_scraper.parse_days_bs4(source)
+    lxml_days = tidal_scraper.parse_days_lxml(source)
+
+    assert len(bs4_days) == len(lxml_days), f'{len(bs4_days)} days with bs4, {len(lxml_days)} with lxml'
+    for a, b in zip(bs4_days, lxml_days):
+        assert (a.date, a.weekday) == (b.date, b.weekday), f'{a.date} {a.weekday} != {b.date} {b.weekday}'
+        assert [(t.tide, t.time, t.height) for t in a.tides] == [(t.tide, t.time, t.height) for t in b.tides], f'tides differ on {a.date}'
+
+    return len(bs4_days)
+
+def main() -> None:
+    rows = []
+
+    for page in sorted(glob.glob(f'{FIXTURES_DIR}/wisuki_*.html')):
+        with open(page, 'r', encoding='utf-8') as file:
+            source = file.read()
+
+        days = check_identical(source)
+
+        for name, parser in tidal_scraper.PARSERS.items():
+            result = bench(lambda: parser(source))
+            rows.append({'page': page.split('/')[-1], 'days': days, 'parser': name, **result})
+
+    print_table('wisuki.com tide table parsing', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Shared helpers for the offline benchmarks - run them from the repo root, e.g. `python -m benchmarks.bench_parser`
+
+### IMPORTS
+import os
+import timeit
+from typing import Callable, Dict, List
+
+### CONSTANTS
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+# Path to a saved fixture file
+def fixture(name: str) -> str:
+    return os.path.join(FIXTURES_DIR, name)
+
+def bench(func: Callable, number: int = None, repeat: int = 5) -> Dict[str, float]:
+    '''
+    Times a function with timeit and keeps the best of a few repeats.
+
+    Parameters:
+        func (Callable): The function to time, called with no arguments
+        number (int): Calls per repeat, picked automatically to take ~0.2s if not given
+        repeat (int): How many times to repeat the measurement
+
+    Returns:
+        Dict[str, float]: ops per second and mean milliseconds per call
+    '''
+    timer = timeit.Timer(func)
+
+    if number is None:
+        number, _ = timer.autorange()
+
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    return {
+        'ops_per_sec':  1 / best,
+        'mean_ms':      best * 1000,
+    }
+
+def print_table(title: str, rows: List[Dict[str, object]]) -> None:
+    '''
+    Prints benchmark results as an aligned table, one row per dict.
+    '''
+    print(f'\n{title}')
+
+    columns = list(rows[0].keys())
+    cells = [[f'{r[c]:.3f}' if isinstance(r[c], float) else str(r[c]) for c in columns] for r in rows]
+    widths = [max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(columns)]
+
+    print('  '.join(c.ljust(w) for c, w in zip(columns, widths)))
+    print('  '.join('-' * w for w in widths))
+    for row in cells:
+        print('  '.join(v.ljust(w) for v, w in zip(row, widths)))
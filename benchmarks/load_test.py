@@ -0,0 +1,292 @@
+# Fires concurrent /tides commands at one bot process, with weatherapi.com and the image searches served by local stand-ins
+#
+#   python -m benchmarks.load_test --requests 500 --concurrency 50
+#   python -m benchmarks.load_test --weather-latency 0.3 --image-latency 0.8 --mix image=1 --periods today
+#
+# Nothing leaves the machine and no Discord token is needed: the command callback is called directly with fake contexts.
+
+### IMPORTS
+import os
+import io
+import json
+import time
+import random
+import asyncio
+import argparse
+import contextlib
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+os.environ.setdefault('WEATHERAPI_KEY', 'load-test')       # never read the real key
+
+from aiohttp import web
+from discord import app_commands
+
+import cards
+import beach_bot
+import img_getter
+from spots import SPOTS
+from weather import get_weather
+from replies import REPLIES
+from weather.cache import WEATHER
+from image_generation.renderer import RENDERER
+from benchmarks.common import fixture, print_table
+
+### CONSTANTS
+HOST = '127.0.0.1'
+DATE = date(2024, 7, 15)            # a date that has tides in data/
+LAG_INTERVAL = 0.01                 # seconds between event loop lag probes
+PERIODS = ('today', 'tomorrow', 'weekly')
+TYPES = ('image', 'message', 'embed')
+
+
+### STAND-INS
+async def start_stubs(weather_latency: float, image_latency: float, today: date = DATE) -> Tuple[web.AppRunner, str]:
+    '''
+    Serves weatherapi.com's forecast.json and the Google / DuckDuckGo image searches on a random local port.
+
+    The forecast's days are moved to start on `today`, the date the bot is told it is.
+
+    Returns:
+        Tuple[web.AppRunner, str]: the server - call its cleanup() to stop it - and its base URL
+    '''
+    with open(fixture('weatherapi_forecast.json'), 'r', encoding='utf-8') as file:
+        data = json.load(file)
+
+    for i, day in enumerate(data['forecast']['forecastday']):
+        day['date'] = (today + timedelta(days=i)).isoformat()
+    forecast = json.dumps(data)
+
+    images = [f'https://images.example/{i}.jpg' for i in range(img_getter.MAX_RESULTS)]
+    google_page = '<html><body>' + ''.join(f'<img src="{url}">' for url in images) + '</body></html>'
+
+    async def weather(request: web.Request) -> web.Response:
+        await asyncio.sleep(weather_latency)
+        return web.Response(text=forecast, content_type='application/json')
+
+    async def google(request: web.Request) -> web.Response:
+        await asyncio.sleep(image_latency)
+        return web.Response(text=google_page, content_type='text/html')
+
+    async def duckduckgo(request: web.Request) -> web.Response:
+        await asyncio.sleep(image_latency)
+        return web.json_response([{'image': url} for url in images])
+
+    app = web.Application()
+    app.router.add_get('/v1/forecast.json', weather)
+    app.router.add_get('/v1/current.json', weather)
+    app.router.add_get('/search', google)
+    app.router.add_get('/ddg', duckduckgo)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, 0).start()
+
+    _, port = runner.addresses[0][:2]
+
+    return runner, f'http://{HOST}:{port}'
+
+def point_at_stubs(base_url: str, weather_ttl: float, image_ttl: float) -> None:
+    '''
+    Sends the bot's weather and image requests to the stand-ins.
+    '''
+    get_weather.CLIENT.base_url = f'{base_url}/v1'
+    WEATHER.ttl = weather_ttl
+    WEATHER.clear()
+
+    img_getter.SEARCH.google_url = f'{base_url}/search'
+    img_getter.THUMBS.ttl = img_getter.IMAGES.ttl = image_ttl
+
+    # DuckDuckGo goes through its own library, so its stand-in is fetched over the same session as Google's
+    async def duckduckgo(search: str) -> List[str]:
+        async with img_getter.SEARCH._get_session().get(f'{base_url}/ddg', params={'q': search}) as response:
+            return [r['image'] for r in await response.json()]
+
+    img_getter.IMAGES.fetch = duckduckgo
+
+
+### FAKE DISCORD
+class FakeAuthor:
+    name = 'load-test'
+
+class FakeContext:
+    '''
+    Stands in for the commands.Context the /tides callback gets. Replies are read and dropped after an optional delay.
+    '''
+    author = FakeAuthor()
+
+    def __init__(self, send_latency: float = 0) -> None:
+        self.send_latency = send_latency
+        self.sent_bytes = 0
+
+    async def reply(self, content: str = None, **kwargs) -> None:
+        await self.send(content, **kwargs)
+
+    async def send(self, content: str = None, file=None, embed=None, **kwargs) -> None:
+        if file is not None:
+            self.sent_bytes += len(file.fp.read())
+        if content:
+            self.sent_bytes += len(content)
+        await asyncio.sleep(self.send_latency)
+
+
+### MEASURING
+class LagMonitor:
+    '''
+    Measures how late the event loop wakes up a task sleeping for LAG_INTERVAL - anything over it is time the loop was blocked.
+    '''
+    def __init__(self, interval: float = LAG_INTERVAL) -> None:
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _probe(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(time.perf_counter() - start - self.interval, 0))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._probe())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+
+# The value below which `share` of the sorted values fall
+def percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(share * len(ordered)), len(ordered) - 1)]
+
+# Parses "image=2,message=1" into weights
+def parse_mix(text: str, allowed: tuple) -> Dict[str, float]:
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in allowed:
+            raise argparse.ArgumentTypeError(f'{name} is not one of {", ".join(allowed)}')
+        weights[name] = float(weight or 1)
+    return weights
+
+
+### RUNNING
+async def load_test(requests: int, concurrency: int, types: Dict[str, float], periods: Dict[str, float], send_latency: float, seed: int) -> Dict[str, object]:
+    '''
+    Runs `requests` /tides commands with at most `concurrency` in flight at once.
+
+    Returns:
+        Dict[str, object]: the latencies of every request by type, errors, wall time and event loop lags
+    '''
+    rng = random.Random(seed)
+    jobs = [
+        (rng.choice(SPOTS), rng.choices(list(periods), list(periods.values()))[0], rng.choices(list(types), list(types.values()))[0])
+        for _ in range(requests)
+    ]
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+
+    async def worker() -> None:
+        while not queue.empty():
+            spot, period, type = queue.get_nowait()
+            ctx = FakeContext(send_latency)
+            start = time.perf_counter()
+
+            try:
+                await beach_bot.tides.callback(ctx, str(spot.id), app_commands.Choice(name=period, value=period), type)
+            except Exception as e:
+                key = f'{type}/{period}: {e.__class__.__name__}'
+                errors[key] = errors.get(key, 0) + 1
+                continue
+
+            latencies.setdefault(f'{type}/{period}', []).append(time.perf_counter() - start)
+
+    monitor = LagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    wall = time.perf_counter() - start
+    await monitor.stop()
+
+    return {'latencies': latencies, 'errors': errors, 'wall': wall, 'lags': monitor.lags}
+
+def report(results: Dict[str, object], concurrency: int) -> None:
+    latencies = results['latencies']
+    every = [l for values in latencies.values() for l in values]
+
+    rows = []
+    for name, values in sorted(latencies.items()) + [('all', every)]:
+        rows.append({
+            'requests': name,
+            'count':    len(values),
+            'p50_ms':   percentile(values, 0.50) * 1000,
+            'p95_ms':   percentile(values, 0.95) * 1000,
+            'p99_ms':   percentile(values, 0.99) * 1000,
+            'max_ms':   max(values, default=0) * 1000,
+        })
+    print_table(f'/tides latency at concurrency {concurrency}', rows)
+
+    lags = results['lags']
+    print(f"\nthroughput:     {len(every) / results['wall']:.1f} requests/s ({len(every)} in {results['wall']:.2f}s)")
+    print(f'loop lag:       max {max(lags, default=0) * 1000:.1f}ms, p99 {percentile(lags, 0.99) * 1000:.1f}ms')
+    print(f"render cache:   {cards.RENDER_CACHE.stats}")
+    print(f'weather cache:  {WEATHER.stats}')
+    print(f'reply cache:    {REPLIES.stats}')
+
+    if results['errors']:
+        print('\nerrors:')
+        for name, count in results['errors'].items():
+            print(f'  {count:>5}  {name}')
+
+async def main_async(args: argparse.Namespace) -> None:
+    stubs, base_url = await start_stubs(args.weather_latency, args.image_latency, args.date)
+    point_at_stubs(base_url, args.weather_ttl, args.image_ttl)
+
+    # the data of the test date, and "today" pinned to it
+    cards.local_today = lambda: args.date
+    beach_bot.REFRESHER.today = lambda: args.date
+    WEATHER.today = lambda: args.date
+    await beach_bot.REFRESHER.refresh(force=True)
+
+    try:
+        # the handler prints every reply - keep that out of the report
+        with contextlib.redirect_stdout(io.StringIO()) if args.quiet else contextlib.nullcontext():
+            results = await load_test(args.requests, args.concurrency, args.types, args.periods, args.send_latency, args.seed)
+
+        report(results, args.concurrency)
+
+    finally:
+        await get_weather.CLIENT.close()
+        await img_getter.SEARCH.close()
+        RENDERER.shutdown()
+        await stubs.cleanup()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Concurrent load test of the /tides command against local stand-ins')
+    parser.add_argument('--requests', type=int, default=200, help='total commands to run')
+    parser.add_argument('--concurrency', type=int, default=20, help='commands in flight at once')
+    parser.add_argument('--mix', dest='types', type=lambda t: parse_mix(t, TYPES), default='image=1,message=1,embed=1', help='reply types and their weights')
+    parser.add_argument('--periods', type=lambda t: parse_mix(t, PERIODS), default='today=1,tomorrow=1,weekly=1', help='periods and their weights')
+    parser.add_argument('--weather-latency', type=float, default=0.15, help='seconds the weatherapi stand-in takes')
+    parser.add_argument('--image-latency', type=float, default=0.5, help='seconds the image search stand-ins take')
+    parser.add_argument('--send-latency', type=float, default=0.05, help='seconds a Discord reply takes')
+    parser.add_argument('--weather-ttl', type=float, default=WEATHER.ttl, help='weather cache TTL - 0 refetches (in the background) every time')
+    parser.add_argument('--image-ttl', type=float, default=img_getter.POOL_TTL, help='image pool TTL')
+    parser.add_argument('--date', type=date.fromisoformat, default=DATE, help='the date the bot thinks it is')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', dest='quiet', action='store_false', help='keep the bot\'s own output')
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
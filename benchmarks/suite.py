@@ -0,0 +1,269 @@
+# Runs every hot-path benchmark offline and compares the results with a saved baseline
+#
+#   python -m benchmarks.suite                  compare with benchmarks/baseline.json, exit 1 on a regression
+#   python -m benchmarks.suite --save           run and save the results as the new baseline
+#   python -m benchmarks.suite -k image         only the cases with "image" in their name
+#
+# The baseline is only meaningful on the machine it was saved on - save a new one when moving the suite elsewhere.
+
+### IMPORTS
+import io
+import os
+import sys
+import json
+import pickle
+import argparse
+import platform
+import tracemalloc
+import contextlib
+from datetime import date, time, timedelta
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import data
+import tide_format
+import tidal_scraper
+from tide_store import TideStore
+from tide_heights import TideHeights
+from spots import Spot, SpotIndex
+from weather.cache import Forecast
+from image_generation import pill, recolour, weather_icons
+from image_generation.encoder import ENCODER
+from image_generation.time_labels import draw_tide_time
+from benchmarks import bench_encoder, bench_model, bench_parser
+from benchmarks.common import bench, fixture, print_table
+
+### CONSTANTS
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+THRESHOLD = 0.3                 # fail when a case gets this much slower than its baseline
+FAST_THRESHOLD = 0.5            # looser limit for cases under FAST_MS, whose timings swing more from run to run
+FAST_MS = 1.0
+REPEAT = 5                      # timeit repeats per case, keeping the best
+RETRIES = 2                     # times a case that looks regressed is measured again before failing - timings are noisy
+RETRY_REPEAT = 15               # repeats of those measurements, so a slow patch on the machine doesn't fail the run
+MONTH = date(2024, 7, 1)        # the month of data/ the loading cases read
+SPOT_ID = 1
+PICKLE_FILE = os.path.join(tide_format.DATA_DIR, f'tides_{MONTH:%m%y}_{SPOT_ID}.pickle')
+COLUMNS_FILE = os.path.join(tide_format.DATA_DIR, tide_format.COLUMNS_FILE.format(f'{MONTH:%m%y}', SPOT_ID))
+
+
+### CASES
+# Every case is set up once, outside of the timing, and returns the function to time
+def setup_parsing() -> Dict[str, Callable]:
+    with open(fixture('wisuki_nazare_0724.html'), 'r', encoding='utf-8') as file:
+        source = file.read()
+
+    bench_parser.check_identical(source)
+
+    return {f'parse_{name}': (lambda parser=parser: parser(source)) for name, parser in tidal_scraper.PARSERS.items()}
+
+def setup_weather() -> Dict[str, Callable]:
+    with open(fixture('weatherapi_forecast.json'), 'r', encoding='utf-8') as file:
+        text = file.read()
+
+    return {'weather_parse': lambda: Forecast.from_json(json.loads(text))}
+
+def setup_loading() -> Dict[str, Callable]:
+    def load_pickle():
+        with open(PICKLE_FILE, 'rb') as file:
+            return pickle.load(file)
+
+    return {
+        'load_pickle':      load_pickle,
+        'load_npy':         lambda: tide_format.load(COLUMNS_FILE),
+        'load_store':       lambda: TideStore.load([MONTH]),
+    }
+
+def setup_days() -> Dict[str, Callable]:
+    store = TideStore.load([MONTH])
+    month = store.days(SPOT_ID, MONTH, MONTH + timedelta(days=30))
+    rows = bench_model.raw_rows()
+
+    return {
+        'days_build':       lambda: bench_model.build(rows, data.Tide, data.Day),
+        'days_weekly':      lambda: store.days(SPOT_ID, MONTH + timedelta(days=10), MONTH + timedelta(days=17)),
+        'daytime_tides':    lambda: [d.daytime_tides() for d in month],
+    }
+
+# Makes sure a lookup exactly on any spot's first or last tide gives that tide's height - not just for the first spot in the arrays
+def check_heights(store: TideStore, heights: TideHeights) -> None:
+    for spot_id in store.spot_ids():
+        columns = store.columns(spot_id)
+        ends = columns[[0, -1]]
+        found, _ = heights.at(spot_id, ends['minute'])
+        assert np.allclose(found, ends['height']), f'spot {spot_id}: {found} at its first and last tide, not {ends["height"]}'
+
+def setup_heights() -> Dict[str, Callable]:
+    store = TideStore.load([MONTH])
+    heights = TideHeights.from_store(store)
+    check_heights(store, heights)
+
+    spot_ids = store.spot_ids()
+    minute = int(store.columns(SPOT_ID)['minute'][10])
+
+    return {
+        'heights_build':        lambda: TideHeights.from_store(store),
+        'heights_all_spots':    lambda: heights.at(spot_ids, minute),
+    }
+
+def setup_images() -> Dict[str, Callable]:
+    high_tide = {'time': time(17, 35), 'height': '3.5'}
+    low_tide = {'time': time(11, 8), 'height': '0.9'}
+
+    def image(compact: bool, cold: bool = False) -> Callable:
+        def run():
+            if cold:
+                pill.create_base.cache_clear()
+            return pill.create_image('TODAY | 8 July', 'São Pedro de Moel', high_tide, low_tide, 22, '116', True, compact, time(13, 0))
+        return run
+
+    icon = weather_icons._source(weather_icons.available()[0])
+    canvas = bench_encoder.sample_canvas(False)
+
+    return {
+        'create_image_full':        image(False),
+        'create_image_compact':     image(True),
+        'create_image_full_cold':   image(False, cold=True),
+        'recolour':                 lambda: recolour.recolour(icon, weather_icons.ICON_COLOUR, (62, 149, 169), weather_icons.TOLERANCE),
+        'draw_tide_time':           lambda: draw_tide_time('11:08'),
+        'encode_png':               lambda: ENCODER.encode(canvas),
+    }
+
+def setup_spots() -> Dict[str, Callable]:
+    # a catalog far bigger than the real one, with made-up Portuguese-ish names
+    words = ['Praia', 'São', 'Pedro', 'Moel', 'Nazaré', 'Costa', 'Caparica', 'Ribeira', 'Ilhas', 'Foz', 'Arelho', 'Baleal', 'Guincho', 'Carcavelos', 'Sagres', 'Odeceixe']
+    spots = [Spot(f'{words[i % 16]} {words[i // 16 % 16]} {words[i // 256 % 16]} {i}', 39.0, -9.0, i, '') for i in range(5000)]
+
+    index = SpotIndex(spots)
+
+    return {
+        'spot_index_5000':      lambda: SpotIndex(spots),
+        'spot_search_prefix':   lambda: index.search('sao pe'),
+        'spot_search_fuzzy':    lambda: index.search('carcavelso'),
+    }
+
+SETUPS = [setup_parsing, setup_weather, setup_loading, setup_days, setup_heights, setup_images, setup_spots]
+
+
+### RUNNING
+# Peak Python heap used by one call, in kB - Pillow's image buffers live outside of it
+def peak_memory(func: Callable) -> float:
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return peak / 1024
+
+def cases(pattern: str = None) -> Dict[str, Callable]:
+    '''
+    Sets up every case whose name contains the pattern.
+    '''
+    funcs = {}
+
+    for setup in SETUPS:
+        for name, func in setup().items():
+            if not pattern or pattern in name:
+                funcs[name] = func
+
+    return funcs
+
+def run(funcs: Dict[str, Callable], repeat: int = REPEAT) -> Dict[str, Dict[str, float]]:
+    '''
+    Times every case, keeping the best of `repeat` measurements. Whatever the cases print is dropped, so it doesn't bury the report.
+
+    Returns:
+        Dict[str, Dict[str, float]]: ops_per_sec, mean_ms and peak_kB of every case
+    '''
+    results = {}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, func in funcs.items():
+            func()      # warm up caches the way a running bot would have them
+            results[name] = {**bench(func, repeat=repeat), 'peak_kB': peak_memory(func)}
+
+    return results
+
+# The slowdown allowed for a case - fast cases get the looser limit
+def threshold_for(base: Dict[str, float], threshold: float) -> float:
+    return max(threshold, FAST_THRESHOLD) if base['mean_ms'] < FAST_MS else threshold
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float = THRESHOLD) -> List[Dict[str, object]]:
+    '''
+    Lines up the results with the baseline.
+
+    Returns:
+        List[Dict[str, object]]: one row per case, with the change in speed and whether it regressed
+    '''
+    rows = []
+
+    for name, result in results.items():
+        base = baseline.get(name)
+        change = result['ops_per_sec'] / base['ops_per_sec'] - 1 if base else None
+        limit = threshold_for(base, threshold) if base else threshold
+
+        rows.append({
+            'case':         name,
+            'ops_per_sec':  result['ops_per_sec'],
+            'mean_ms':      result['mean_ms'],
+            'peak_kB':      result['peak_kB'],
+            'baseline':     base['ops_per_sec'] if base else '-',
+            'change':       f'{change:+.1%}' if change is not None else 'new',
+            'limit':        f'-{limit:.0%}',
+            'status':       'REGRESSED' if change is not None and change < -limit else 'ok',
+        })
+
+    return rows
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Offline benchmarks of the tide bot\'s hot paths')
+    parser.add_argument('-k', dest='pattern', help='only run cases containing this')
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline file to compare with or save to')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='slowdown that counts as a regression, 0.25 = 25%%')
+    args = parser.parse_args(argv)
+
+    funcs = cases(args.pattern)
+    results = run(funcs)
+
+    if args.save:
+        # keep the cases that weren't run this time
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r') as file:
+                baseline = json.load(file)['results']
+        baseline.update(results)
+
+        with open(args.baseline, 'w') as file:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(), 'results': baseline}, file, indent=2)
+
+        print_table('Hot paths', [{'case': name, **result} for name, result in results.items()])
+        print(f'\nSaved the baseline to {args.baseline}')
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)['results']
+
+    # measure anything that looks slower again, for longer, keeping its best run
+    for _ in range(RETRIES):
+        regressed = [r['case'] for r in compare(results, baseline, args.threshold) if r['status'] == 'REGRESSED']
+        for name, result in run({name: funcs[name] for name in regressed}, RETRY_REPEAT).items():
+            if result['ops_per_sec'] > results[name]['ops_per_sec']:
+                results[name] = result
+
+    rows = compare(results, baseline, args.threshold)
+    print_table(f'Hot paths (regression past {args.threshold:.0%}, or {max(args.threshold, FAST_THRESHOLD):.0%} under {FAST_MS:g}ms, fails)', rows)
+
+    regressed = [r['case'] for r in rows if r['status'] == 'REGRESSED']
+    if regressed:
+        print(f'\n{len(regressed)} regressed: {", ".join(regressed)}')
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
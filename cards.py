@@ -0,0 +1,153 @@
+# Builds the tide card images - shared by the /tides command and the warm-up job
+
+### IMPORTS
+import asyncio
+from io import BytesIO
+from datetime import date, timedelta
+from typing import Iterable, List, Tuple
+
+from data import Day, local_today
+from spots import Spot, SPOTS
+from tide_store import TideStore
+from weather.cache import WEATHER
+from image_generation.renderer import RENDERER
+from image_generation.render_cache import RENDER_CACHE
+from image_generation.chart import create_chart
+
+### CONSTANTS
+PERIODS = ('today', 'tomorrow')     # periods that have a card
+SIZES = (True, False)               # compact and full-size cards
+
+# Pre-rendering shares the render pool with interactive requests, so it only ever takes half of the workers
+WARM_LIMIT = asyncio.Semaphore(max(1, RENDERER.workers // 2))
+
+
+# Header date of a card, as "TODAY | 8 July"
+def card_date(period: str, day: date) -> str:
+    return f"{period.upper()} | {day.strftime('%-d %B')}"
+
+async def card_weather(spot: Spot, period: str) -> Tuple[int, str]:
+    '''
+    Gets the weather shown on a card: the current weather for today, the forecast for tomorrow.
+
+    Both come from the spot's cached forecast, so they cost one weatherapi.com call between them.
+
+    Returns:
+        Tuple[int, str]: The temperature and the weather condition code
+    '''
+    if period == 'today':
+        return await WEATHER.current(spot.coordinates)
+
+    return await WEATHER.tomorrow(spot.coordinates)
+
+async def render_card(spot: Spot, day: Day, period: str, temp: int, wwo_code: str, compact: bool = True) -> BytesIO:
+    '''
+    Renders the tide card of a spot for a day, through the render cache.
+
+    Parameters:
+        spot (Spot): The beach
+        day (Day): The tides of the day
+        period (str): 'today' or 'tomorrow'
+        temp (int): The temperature to show
+        wwo_code (str): The weather condition code
+        compact (bool): Whether the card should be compact or full-sized
+
+    Returns:
+        BytesIO: The generated image
+    '''
+    # get tides occuring during the day
+    high_tide, low_tide = day.daytime_tides()
+
+    return await RENDER_CACHE.render(
+        card_date(period, day.datetime),
+        spot.name,
+        { 'time' : high_tide.datetime, 'height' : high_tide.height[:-1] },
+        { 'time' : low_tide.datetime, 'height' : low_tide.height[:-1] },
+        temp if temp else None,
+        wwo_code,
+        period == 'today',
+        compact
+    )
+
+async def render_chart(spot: Spot, store: TideStore, days: List[Day], period: str = 'weekly') -> BytesIO:
+    '''
+    Renders the tide chart of a spot over several days in the render pool, from the store's columns of those days.
+
+    Returns:
+        BytesIO: The generated image
+    '''
+    first, last = days[0].datetime, days[-1].datetime
+    title = f"{period.upper()} | {first.strftime('%-d %B')} - {last.strftime('%-d %B')}"
+
+    # the tides of the days either side carry the curve from the first midnight to the last
+    rows = store.rows(spot.id, first - timedelta(days=1), last + timedelta(days=1))
+
+    return await RENDERER.run(create_chart, spot.name, rows, first, last, title)
+
+async def warm_spot(store: TideStore, spot: Spot, sizes: Iterable[bool] = SIZES, periods: Iterable[str] = PERIODS, fetch: bool = True) -> int:
+    '''
+    Renders a spot's cards into the render cache, with the weather of its cached forecast.
+
+    Today's cards have the time marker on them, so a warm one is only served until the marker moves -
+    they're rendered again at every marker step (see beach_bot.warm_today).
+
+    Parameters:
+        store (TideStore): The tidal data
+        spot (Spot): The beach
+        sizes (Iterable[bool]): Compact and/or full-sized cards
+        periods (Iterable[str]): 'today' and/or 'tomorrow'
+        fetch (bool): Whether to fetch the forecast if it isn't cached - if not, a spot without one is skipped
+
+    Returns:
+        int: The number of cards rendered
+    '''
+    rendered = 0
+
+    for period in periods:
+        day = store.day(spot.id, local_today() + timedelta(days=PERIODS.index(period)))
+        if day is None:
+            continue
+
+        try:
+            if fetch:
+                temp, wwo_code = await card_weather(spot, period)
+            else:
+                forecast = WEATHER.cached(spot.coordinates)
+                if forecast is None:
+                    return rendered
+                temp, wwo_code = forecast.current if period == 'today' else forecast.day(forecast.fetched_on + timedelta(days=1))
+
+            for compact in sizes:
+                async with WARM_LIMIT:
+                    await render_card(spot, day, period, temp, wwo_code, compact)
+                rendered += 1
+
+        except Exception as e:
+            print(f'[cards.py] >>> Couldn\'t pre-render {period} at {spot.name}: {e}')
+
+    return rendered
+
+async def prerender(store: TideStore, spots: Iterable[Spot] = SPOTS, sizes: Iterable[bool] = SIZES, periods: Iterable[str] = PERIODS, fetch: bool = True) -> int:
+    '''
+    Renders the cards of every spot into the render cache (see warm_spot), so the first request for them is served warm.
+
+    Parameters:
+        store (TideStore): The tidal data
+        spots (Iterable[Spot]): The spots to render, defaults to all of them
+        sizes (Iterable[bool]): Compact and/or full-sized cards
+        periods (Iterable[str]): 'today' and/or 'tomorrow'
+        fetch (bool): Whether to fetch the forecasts that aren't cached, or skip those spots
+
+    Returns:
+        int: The number of cards rendered
+    '''
+    spots = list(spots)
+    sizes = tuple(sizes)
+    periods = tuple(periods)
+
+    # one forecast per spot
+    if fetch:
+        await WEATHER.warm(spot.coordinates for spot in spots)
+    rendered = await asyncio.gather(*(warm_spot(store, spot, sizes, periods, fetch) for spot in spots))
+
+    return sum(rendered)
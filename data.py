@@ -2,17 +2,39 @@
 
 # IMPORTS
 from typing import List, Tuple
-from datetime import datetime, time
+from datetime import date, datetime, time
 import pytz
 
 # Timezone
 timezone = pytz.timezone('Europe/Lisbon')
 
+# Daytime window used for the tide cards, in minutes since midnight
+DAYTIME_START = 9 * 60
+DAYTIME_END = 21 * 60
+
+# Parses "HH:MM" into minutes since midnight
+def parse_minutes(time: str) -> int:
+    hours, minutes = time.split(':')
+    return int(hours) * 60 + int(minutes)
+
+# Parses "DD/MM/YYYY" into a date
+def parse_date(day: str) -> date:
+    d, m, y = day.split('/')
+    return date(int(y), int(m), int(d))
+
+# Today's date at the beaches
+def local_today() -> date:
+    return datetime.now(timezone).date()
+
 # TIDE
 class Tide:
     """
     Represents an ocean tide in a day.
+
+    The time and height are parsed once, into minutes since midnight and metres.
+    `time`, `height` and `datetime` are worked out from those when read.
     """
+    __slots__ = ('tide', 'minutes', 'height_m')
 
     def __init__(self, tide: bool, time: str, height: str) -> None:
         '''
@@ -23,19 +45,48 @@ class Tide:
             whether the tide is high or low
 
         - time: str
-            the time of the tide
+            the time of the tide, as "HH:MM"
 
         - height: str
-            the height of the tide
+            the height of the tide, as "3.5m"
 
         '''
         self.tide = tide
-        self.time = time
-        self.height = height
-    
+        self.minutes = parse_minutes(time)
+        self.height_m = float(height.rstrip('m'))
+
+    @classmethod
+    def from_values(cls, tide: bool, minutes: int, height_m: float) -> 'Tide':
+        '''
+        Creates a Tide from already parsed values, skipping the string parsing.
+        '''
+        t = cls.__new__(cls)
+        t.tide = tide
+        t.minutes = minutes
+        t.height_m = height_m
+        return t
+
+    @property
+    def time(self) -> str:
+        return f'{self.minutes // 60:02d}:{self.minutes % 60:02d}'
+
+    @property
+    def height(self) -> str:
+        return f'{self.height_m:g}m'
+
     @property
     def datetime(self) -> time:
-        return datetime.strptime(self.time, "%H:%M").time()
+        return time(self.minutes // 60, self.minutes % 60)
+
+    # Pickling - also reads Tides pickled before they had slots, which stored the time and height as strings
+    def __getstate__(self) -> tuple:
+        return (self.tide, self.minutes, self.height_m)
+
+    def __setstate__(self, state) -> None:
+        if isinstance(state, dict):
+            self.__init__(state['tide'], state['time'], state['height'])
+        else:
+            self.tide, self.minutes, self.height_m = state
     
     def __repr__(self) -> str:
         '''
@@ -59,12 +110,38 @@ class Day:
 
     - tides: List[Tide]
         the tides in the day
+
+    - datetime: date
+        the date, parsed
     '''
+    __slots__ = ('date', 'weekday', 'tides', 'datetime')
+
     def __init__(self, date: str, weekday: str, tides: List[Tide]) -> None:
         self.date = date
         self.weekday = weekday
         self.tides = tides
-        self.datetime = timezone.localize(datetime.strptime(date, "%d/%m/%Y")).date()
+        self.datetime = parse_date(date)
+
+    @classmethod
+    def from_date(cls, day: date, weekday: str, tides: List[Tide]) -> 'Day':
+        '''
+        Creates a Day from an already parsed date, skipping the string parsing.
+        '''
+        d = cls.__new__(cls)
+        d.date = f'{day.day:02d}/{day.month:02d}/{day.year}'
+        d.weekday = weekday
+        d.tides = tides
+        d.datetime = day
+        return d
+
+    # Pickling - also reads Days pickled before they had slots
+    def __getstate__(self) -> tuple:
+        return (self.date, self.weekday, self.tides, self.datetime)
+
+    def __setstate__(self, state) -> None:
+        if isinstance(state, dict):
+            state = (state['date'], state['weekday'], state['tides'], state['datetime'])
+        self.date, self.weekday, self.tides, self.datetime = state
     
     def __repr__(self) -> str:
         tides = "\n".join([str(tide) for tide in self.tides])
@@ -75,15 +152,7 @@ class Day:
         '''
         Returns the tides in the day that are in the daytime as a tuple of Tide objects.
         '''
-        start_time = time(9,0)
-        end_time = time(21,0)
-        tides = []
-
-        for t in self.tides:
-            tide_time = datetime.strptime(t.time, "%H:%M").time()
-
-            if start_time <= tide_time <= end_time:
-                tides.append(t)
+        tides = [t for t in self.tides if DAYTIME_START <= t.minutes <= DAYTIME_END]
         
         high_tide = next((t for t in tides if t.tide), None)
         low_tide = next((t for t in tides if not t.tide), None)
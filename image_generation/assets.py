@@ -0,0 +1,108 @@
+### Keeps the template and marker images decoded in memory, so cards never re-open them from disk
+
+### IMPORTS
+import time
+from PIL import Image
+from typing import Dict, List
+
+### CONSTANTS
+VIEW_MODES = ('L', 'RGBA')      # modes Pillow can wrap around a bytes buffer without copying
+
+
+class Asset:
+    '''
+    An image decoded once, in the mode it's used in.
+
+    Attributes:
+    - name: str
+    - path: str
+    - mode: str
+    - size: Tuple[int, int]
+    - load_ms: float
+        time taken to open, decode and convert the file
+    '''
+    def __init__(self, name: str, path: str, mode: str) -> None:
+        self.name = name
+        self.path = path
+        self.mode = mode
+
+        start = time.perf_counter()
+        with Image.open(path) as file:
+            image = file.convert(mode) if file.mode != mode else file.copy()
+        image.load()
+        self.load_ms = (time.perf_counter() - start) * 1000
+
+        self.size = image.size
+
+        # immutable pixels that read-only views are mapped onto - other modes keep the decoded image
+        self._pixels = image.tobytes() if mode in VIEW_MODES else None
+        self._image = image if self._pixels is None else None
+
+    @property
+    def bytes(self) -> int:
+        '''
+        Memory taken by the decoded pixels.
+        '''
+        width, height = self.size
+        return width * height * Image.getmodebands(self.mode)
+
+    def view(self) -> Image.Image:
+        '''
+        Returns a read-only image of the asset. L and RGBA assets are mapped straight onto the decoded pixels,
+        anything drawn on the view goes to a private copy. Other modes get a copy.
+        '''
+        if self._pixels is None:
+            return self._image.copy()
+
+        return Image.frombuffer(self.mode, self.size, self._pixels, 'raw', self.mode, 0, 1)
+
+    def copy(self) -> Image.Image:
+        return self.view().copy() if self._pixels is not None else self._image.copy()
+
+
+class AssetManager:
+    '''
+    Registry of decoded assets. Hands out read-only views to paste from, and fresh copies as canvases to draw on.
+    '''
+    def __init__(self) -> None:
+        self._assets: Dict[str, Asset] = {}
+
+    def load(self, name: str, path: str, mode: str = 'RGBA') -> Image.Image:
+        '''
+        Decodes an asset, unless it's already loaded, and returns a read-only view of it.
+        '''
+        if name not in self._assets:
+            self._assets[name] = Asset(name, path, mode)
+
+        return self.get(name)
+
+    def get(self, name: str) -> Image.Image:
+        '''
+        Returns a read-only view of an asset, to paste from.
+        '''
+        return self._assets[name].view()
+
+    def canvas(self, name: str) -> Image.Image:
+        '''
+        Returns a private copy of an asset to draw on.
+        '''
+        return self._assets[name].copy()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(a.bytes for a in self._assets.values())
+
+    def stats(self) -> List[Dict[str, object]]:
+        '''
+        Size, mode, memory and load time of every asset.
+        '''
+        return [
+            {
+                'name':     a.name,
+                'size':     a.size,
+                'mode':     a.mode,
+                'bytes':    a.bytes,
+                'load_ms':  a.load_ms,
+            }
+            for a in self._assets.values()
+        ]
@@ -0,0 +1,118 @@
+### Draws a multi-day chart of the tide curve
+
+### IMPORTS
+from io import BytesIO
+from datetime import date, timedelta
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from tide_format import date_minutes
+from tide_heights import TideHeights
+from image_generation.fonts import Font, FontStyle, FontSize
+from image_generation.text import TextAnchor, Text, draw_text
+from image_generation.encoder import Encoder, ENCODER
+from image_generation.pill import CANVAS_SIZE, BG_COLOUR, MODE, HI_TIDE_COLOUR
+
+### CONSTANTS - chart area
+CHART_LEFT = 30
+CHART_RIGHT = 812
+CHART_TOP = 190
+CHART_BOTTOM = 520
+CURVE_PADDING = 40                      # space kept above the highest and below the lowest tide for their labels
+DAY_LABEL_POS_Y = 550
+HEIGHT_LABEL_OFFSET = 14
+
+### Colours
+TITLE_COLOUR = '#3E95A9'
+WATER_COLOUR = (62, 149, 169)           # same blue as templates/tide_graph.png
+CURVE_COLOUR = (31, 94, 110)            # darker blue of the water, so the line shows against the background
+DAY_LINE_COLOUR = (213, 226, 233)
+DAY_LABEL_COLOUR = '#5A6B70'
+LOW_LABEL_COLOUR = (255, 255, 255)      # low tide heights sit inside the water
+
+# Short weekday names, Monday first
+WEEKDAYS_SHORT = ['SEG', 'TER', 'QUA', 'QUI', 'SEX', 'SÁB', 'DOM']
+
+
+def create_chart(spot_name: str, columns: np.ndarray, first: date, last: date, title: str = None, encoder: Encoder = None) -> BytesIO:
+    '''
+    Creates an image with the tide curve of a spot over several days.
+
+    The curve goes through every high and low tide, following a cosine between them. All its points are worked out
+    in one batched TideHeights lookup (one sample per pixel column) and drawn with a single polygon and line.
+
+    Args:
+        - spot_name (str): The name of the beach.
+        - columns (np.ndarray): The spot's tides from `first` to `last`, in the columnar format of tide_format -
+          with the day before and after too, so the curve reaches the edges of the chart.
+        - first (date): The first day to chart.
+        - last (date): The last day to chart.
+        - title (str, optional): The header text. Defaults to the range of dates.
+        - encoder (Encoder, optional): How to encode the image. Defaults to encoder.ENCODER.
+
+    Returns:
+        - BytesIO: The generated image as a bytes object
+    '''
+    n_days = (last - first).days + 1
+    print(f'[chart.py] >>> Creating {n_days} day chart for {spot_name}')
+
+    canvas = Image.new(MODE, CANVAS_SIZE, BG_COLOUR)
+    draw = ImageDraw.Draw(canvas)
+
+    # the x axis runs from the beaches' midnight before the first day to the one after the last, in epoch minutes,
+    # so days with a clock change are an hour shorter or longer
+    midnights = [date_minutes(first + timedelta(days=i)) for i in range(n_days + 1)]
+    start, end = midnights[0], midnights[-1]
+    width = CHART_RIGHT - CHART_LEFT
+    x_scale = width / (end - start)
+    curve_bottom = CHART_BOTTOM - CURVE_PADDING
+    curve_height = CHART_BOTTOM - CHART_TOP - 2 * CURVE_PADDING
+
+    # Header
+    title = title or f"{first.strftime('%-d %B')} - {last.strftime('%-d %B')}"
+    draw_text(canvas, Text(title, (30, 59), Font(FontStyle.CONDENSED, FontSize.MEDIUM), TITLE_COLOUR, TextAnchor.LEFT))
+    draw_text(canvas, Text(spot_name, (30, 127), Font(FontStyle.BOLD_CONDENSED, FontSize.LARGE), TITLE_COLOUR, TextAnchor.LEFT))
+
+    # Tide curve - one sample per pixel column. Samples without a tide on both sides are NaN and left blank,
+    # so missing data never looks like water
+    xs = np.arange(width + 1)
+    heights, _ = TideHeights(columns).at(int(columns['spot'][0]), start + xs / x_scale)
+    drawn = ~np.isnan(heights)
+
+    low, high = (heights[drawn].min(), heights[drawn].max()) if drawn.any() else (0, 0)
+    y_scale = curve_height / (high - low) if high > low else 0
+    ys = curve_bottom - (heights - low) * y_scale
+
+    # one polygon and line per unbroken run of samples
+    edges = np.flatnonzero(np.diff(drawn.astype(np.int8))) + 1
+    runs = [run for run in np.split(xs, edges) if drawn[run[0]]]
+    curves = [np.column_stack((run + CHART_LEFT, ys[run])).ravel().tolist() for run in runs]
+
+    for run, curve in zip(runs, curves):
+        draw.polygon(curve + [run[-1] + CHART_LEFT, CHART_BOTTOM, run[0] + CHART_LEFT, CHART_BOTTOM], fill=WATER_COLOUR)
+
+    # Day separators and labels
+    for i in range(n_days):
+        x, next_x = (CHART_LEFT + (m - start) * x_scale for m in midnights[i:i + 2])
+        if i:
+            draw.line((x, CHART_TOP, x, CHART_BOTTOM), fill=DAY_LINE_COLOUR, width=1)
+
+        label_date = first + timedelta(days=i)
+        label = f'{WEEKDAYS_SHORT[label_date.weekday()]} {label_date.day}'
+        draw_text(canvas, Text(label, ((x + next_x) / 2, DAY_LABEL_POS_Y), Font(FontStyle.BOLD_CONDENSED, FontSize.SMALL), DAY_LABEL_COLOUR, TextAnchor.CENTER))
+
+    for curve in curves:
+        draw.line(curve, fill=CURVE_COLOUR, width=3, joint='curve')
+
+    # Heights of the high and low tides on the chart - the ones from the days either side only shape the curve
+    shown = columns[(columns['minute'] >= start) & (columns['minute'] < end)]
+    extrema_minutes = shown['minute'].astype(np.int64)
+    extrema_heights = shown['height'].round(2).astype(np.float64)
+    marker_xs = CHART_LEFT + (extrema_minutes - start) * x_scale
+    marker_ys = curve_bottom - (extrema_heights - low) * y_scale
+    for x, y, h, is_high in zip(marker_xs.tolist(), marker_ys.tolist(), extrema_heights.tolist(), shown['high'].tolist()):
+        y = y - HEIGHT_LABEL_OFFSET if is_high else y + HEIGHT_LABEL_OFFSET
+        draw_text(canvas, Text(f'{h:g}', (x, y), Font(FontStyle.BOLD_CONDENSED, FontSize.XS), HI_TIDE_COLOUR if is_high else LOW_LABEL_COLOUR, TextAnchor.CENTER))
+
+    return (encoder or ENCODER).encode(canvas)
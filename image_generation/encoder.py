@@ -0,0 +1,90 @@
+### Turns a finished tide card canvas into the bytes that get uploaded to Discord
+
+### IMPORTS
+import time
+from io import BytesIO
+from contextvars import ContextVar
+from PIL import Image
+from typing import Dict
+
+# Seconds spent encoding in the current context - read by the renderer to tell encoding apart from drawing
+ENCODE_SECONDS: ContextVar[float] = ContextVar('encode_seconds', default=0.0)
+
+
+class Encoder:
+    '''
+    Settings for encoding a tide card.
+
+    Attributes:
+    - format: str
+        'PNG' or 'WEBP'
+    - compress_level: int
+        zlib level for PNG, 0 (none) to 9 (smallest, slowest)
+    - colours: int
+        if set, the card is quantised to an adaptive palette of this many colours before encoding
+    - quantize_method: Image.Quantize
+        how the palette is picked - MEDIANCUT is the most faithful, FASTOCTREE several times faster
+    - lossless: bool
+        lossless WebP
+    - quality: int
+        WebP quality (or compression effort when lossless), 0 to 100
+    - method: int
+        WebP speed/size trade-off, 0 (fastest) to 6 (smallest)
+    '''
+    def __init__(self, format: str = 'PNG', compress_level: int = 6, colours: int = None, quantize_method: Image.Quantize = Image.Quantize.MEDIANCUT, lossless: bool = True, quality: int = 80, method: int = 4) -> None:
+        self.format = format.upper()
+        self.compress_level = compress_level
+        self.colours = colours
+        self.quantize_method = quantize_method
+        self.lossless = lossless
+        self.quality = quality
+        self.method = method
+
+    def __repr__(self) -> str:
+        if self.format == 'PNG':
+            return f'PNG(level={self.compress_level}, colours={self.colours})'
+        return f'WEBP(lossless={self.lossless}, quality={self.quality}, method={self.method}, colours={self.colours})'
+
+    @property
+    def extension(self) -> str:
+        '''
+        File extension for the encoded card, without the dot.
+        '''
+        return self.format.lower()
+
+    def encode(self, canvas: Image.Image) -> BytesIO:
+        '''
+        Encodes a canvas with these settings.
+
+        Returns:
+            BytesIO: The encoded image as a "file-like object"
+        '''
+        start = time.perf_counter()
+
+        if self.colours:
+            canvas = canvas.quantize(colors=self.colours, method=self.quantize_method, dither=Image.Dither.NONE)
+
+        card = BytesIO()
+
+        if self.format == 'PNG':
+            canvas.save(card, format='PNG', compress_level=self.compress_level)
+        else:
+            canvas.save(card, format='WEBP', lossless=self.lossless, quality=self.quality, method=self.method)
+
+        ENCODE_SECONDS.set(ENCODE_SECONDS.get() + time.perf_counter() - start)
+
+        return card
+
+
+# Encoders worth comparing - see benchmarks/bench_encoder.py
+PRESETS: Dict[str, Encoder] = {
+    'png':              Encoder('PNG', compress_level=6),
+    'png-fast':         Encoder('PNG', compress_level=1),
+    'png-palette':      Encoder('PNG', compress_level=6, colours=64),
+    'png-palette-fast': Encoder('PNG', compress_level=1, colours=64, quantize_method=Image.Quantize.FASTOCTREE),
+    'webp':             Encoder('WEBP', lossless=False, quality=85, method=4),
+    'webp-lossless':    Encoder('WEBP', lossless=True, quality=50, method=2),
+}
+
+# Encoder used for the cards the bot sends - same as Pillow's default PNG settings
+ENCODER = PRESETS['png']
@@ -1,5 +1,6 @@
 import os
 from enum import Enum
+from functools import lru_cache
 from PIL import ImageFont
 
 class FontStyle(Enum):
@@ -22,6 +23,13 @@ class FontSize(Enum):
     LARGE       = 64
     XL          = 90
 
+@lru_cache(maxsize=None)
+def get_font(style: FontStyle, size: FontSize) -> ImageFont.FreeTypeFont:
+    '''
+    Process-wide font registry: every style and size pair is loaded from its .otf file only once.
+    '''
+    return ImageFont.truetype(style.value, size.value)
+
 class Font:
     '''
     Represents a single font to be used with PIL.
@@ -29,4 +37,4 @@ class Font:
     def __init__(self, style: FontStyle, size: FontSize):
         self.style = style
         self.size = size
-        self.font = ImageFont.truetype(self.style.value, self.size.value)
\ No newline at end of file
+        self.font = get_font(style, size)
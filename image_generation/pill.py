@@ -6,13 +6,15 @@ import os
 from io import BytesIO                          # Used to store the output images in memory instead of saving them to disk
 
 # Pillow
-from PIL import Image, ImageDraw, ImageFont     # Importing PIL to generate and manipulate  images
-from PIL import ImageColor                      # To convert #Hex colour to R,G,B
+from PIL import Image, ImageFont                # Importing PIL to generate and manipulate  images
 
 # Font and Text helper class
 from image_generation.fonts import Font, FontStyle, FontSize
-from image_generation.text import TextAnchor, Text
-from image_generation import recolour
+from image_generation.text import TextAnchor, Text, draw_text
+from image_generation import weather_icons
+from image_generation.encoder import Encoder, ENCODER
+from image_generation.time_labels import TIME_LABELS
+from image_generation.assets import AssetManager
 
 # Date and time
 from datetime import datetime, time
@@ -21,7 +23,10 @@ from datetime import datetime, time
 from weather import weather_codes
 
 # Typing
-from typing import Dict, Union
+from typing import Dict, Tuple, Union
+
+# Caching the base layers
+from functools import lru_cache
 
 ### CONSTANTS for creating the image canvas and formatting other elements
 CANVAS_SIZE = (842, 596)
@@ -35,15 +40,15 @@ TIME_MARKER         = os.path.join(os.path.dirname(__file__), 'templates/time_ma
 HI_TIDE_MARKER      = os.path.join(os.path.dirname(__file__), 'templates/hi_tide_marker.png')
 LO_TIDE_MARKER      = os.path.join(os.path.dirname(__file__), 'templates/lo_tide_marker.png')
 TIDE_GRAPH          = os.path.join(os.path.dirname(__file__), 'templates/tide_graph.png')
-ICONS_DIR           = os.path.join(os.path.dirname(__file__), 'icons/')
 
-### Open template and asset images
-TEMPLATE_IMG = Image.open(TEMPLATE)
-TEMPLATE_COMPACT_IMG = Image.open(TEMPLATE_COMPACT)
-TIME_MARKER_IMG = Image.open(TIME_MARKER).convert('RGBA')
-HI_TIDE_MARKER_IMG = Image.open(HI_TIDE_MARKER).convert('RGBA')
-LO_TIDE_MARKER_IMG = Image.open(LO_TIDE_MARKER).convert('RGBA')
-TIDE_GRAPH_IMG = Image.open(TIDE_GRAPH).convert('RGBA')
+### Decode template and asset images once - the markers and graph below are read-only views
+ASSETS = AssetManager()
+TEMPLATE_IMG = ASSETS.load('template', TEMPLATE, MODE)
+TEMPLATE_COMPACT_IMG = ASSETS.load('template_compact', TEMPLATE_COMPACT, MODE)
+TIME_MARKER_IMG = ASSETS.load('time_marker', TIME_MARKER)
+HI_TIDE_MARKER_IMG = ASSETS.load('hi_tide_marker', HI_TIDE_MARKER)
+LO_TIDE_MARKER_IMG = ASSETS.load('lo_tide_marker', LO_TIDE_MARKER)
+TIDE_GRAPH_IMG = ASSETS.load('tide_graph', TIDE_GRAPH)
 
 ### Constant positions - FULL
 TIME_MARKER_POS_Y = 490
@@ -69,11 +74,17 @@ TIDE_TIME_POS_Y_COMPACT = 200
 HI_TIDE_COLOUR = '#D82E2A'
 LO_TIDE_COLOUR = '#A1CC39'
 
+### Number of precomposed base layers kept in memory
+BASE_CACHE_SIZE = 64
+
 ### MAIN FUNCTION
-def create_image(date: str, spot_name: str, high_tide: Dict[str, Union[time, str]], low_tide:  Dict[str, Union[time, str]], temperature: int = 0, wwo_code: int = 0, today: bool = False, compact: bool = False) -> BytesIO:
+def create_image(date: str, spot_name: str, high_tide: Dict[str, Union[time, str]], low_tide:  Dict[str, Union[time, str]], temperature: int = 0, wwo_code: int = 0, today: bool = False, compact: bool = False, now: time = None, encoder: Encoder = None) -> BytesIO:
     '''
     Creates an image with information about the tides at a beach on a specific date.
 
+    The parts of the card that are fixed for a spot and day come from a cached base layer (see create_base),
+    so only the time marker and the weather are drawn for every request.
+
     Args:
         - date (str): The date for which the tides should be displayed.
         - spot_name (str): The name of the beach.
@@ -83,40 +94,77 @@ def create_image(date: str, spot_name: str, high_tide: Dict[str, Union[time, str
         - wwo_code (int): The WWO code for the weather conditions.
         - today (bool, optional): Whether the information is for today. Defaults to False.
         - compact (bool, optional): Whether the image should be compact or full-sized. Defaults to False.
+        - now (time, optional): Where to put the time marker when the information is for today. Defaults to the current time.
+        - encoder (Encoder, optional): How to encode the image. Defaults to encoder.ENCODER.
 
     Returns:
         - BytesIO: The generated image as a bytes object
     '''
     print(f'[pill.py] >>> Creating image for {spot_name} on {date}')
-    # CREATING CANVAS
-    # canvas = Image.new(MODE, CANVAS_SIZE, BG_COLOUR)
 
-    # Load the starting canvas from disk - Full Size or Compact
-    canvas = Image.open(TEMPLATE).copy() if not compact else Image.open(TEMPLATE_COMPACT).copy()
+    # Getting accent colour
+    accent = weather_codes.ACCENT_COLOUR[weather_codes.WWO_CODE[wwo_code]]
+
+    # Copy of the precomposed base layer for this spot and day
+    canvas = create_base(
+        date,
+        spot_name,
+        (high_tide['time'], high_tide['height']),
+        (low_tide['time'], low_tide['height']),
+        accent,
+        compact
+    ).copy()
+
+    # Add the parts that change through the day
+    draw_overlay(canvas, temperature, wwo_code, today, compact, now)
+
+    # DEBUGGING
+    # canvas.save("test.png", "PNG", quality=100)
+    # print(canvas)
+
+    # Saving the created image to memory in BytesIO as a "file-like object" -> https://stackoverflow.com/questions/60006794/send-image-from-memory
+    tide_card = (encoder or ENCODER).encode(canvas)
+
+    return tide_card
+
+
+@lru_cache(maxsize=BASE_CACHE_SIZE)
+def create_base(date: str, spot_name: str, high_tide: Tuple[time, str], low_tide: Tuple[time, str], accent: str, compact: bool = False) -> Image:
+    '''
+    Draws everything on a card that doesn't change through the day: the template, the header, the tide graph,
+    the tide markers, their heights and their times. Base layers are cached, so don't draw on the returned image - copy it.
+
+    Args:
+        - date (str): The date for which the tides should be displayed.
+        - spot_name (str): The name of the beach.
+        - high_tide: The time and height of the high tide.
+        - low_tide: The time and height of the low tide.
+        - accent (str): The #Hex accent colour of the header text.
+        - compact (bool, optional): Whether the image should be compact or full-sized. Defaults to False.
+
+    Returns:
+        - Image: The base layer of the card
+    '''
+    high_tide_time, high_tide_height = high_tide
+    low_tide_time, low_tide_height = low_tide
+
+    # Copy of the decoded starting canvas - Full Size or Compact
+    canvas = ASSETS.canvas('template' if not compact else 'template_compact')
 
     # Init vars for element positions depending on size requested
     if not compact:
-        time_marker_pos_y   =   TIME_MARKER_POS_Y
         tide_marker_pos_y   =   TIDE_MARKER_POS_Y
         tide_graph_pos_y    =   TIDE_GRAPH__POS_Y
         high_tide_pos_y     =   HIGH_TIDE_INFO_POS_Y
         low_tide_pos_y      =   LOW_TIDE_INFO_POS_Y
         tide_time_pos_y     =   TIDE_TIME_POS_Y
     else:
-        time_marker_pos_y   =   TIME_MARKER_POS_Y_COMPACT
         tide_marker_pos_y   =   TIDE_MARKER_POS_Y_COMPACT
         tide_graph_pos_y    =   TIDE_GRAPH__POS_Y_COMPACT
         high_tide_pos_y     =   HIGH_TIDE_INFO_POS_Y_COMPACT
         low_tide_pos_y      =   LOW_TIDE_INFO_POS_Y_COMPACT
         tide_time_pos_y     =   TIDE_TIME_POS_Y_COMPACT
 
-    # Enable editing the image
-    draw = ImageDraw.Draw(canvas)
-
-    # Getting accent colour
-    accent = weather_codes.ACCENT_COLOUR[weather_codes.WWO_CODE[wwo_code]]
-    accent_rgb = ImageColor.getcolor(accent, 'RGB') # converting it to RGB for the recolour script
-
     # Create Header Text objects
     spot = Text(
         spot_name,
@@ -133,58 +181,41 @@ def create_image(date: str, spot_name: str, high_tide: Dict[str, Union[time, str
         TextAnchor.LEFT
     )
     header_texts = [spot, weekday]
-    
-    if temperature:
-        temp = Text(
-            f'{temperature}º',
-            (810, 120),
-            Font(FontStyle.BOLD, FontSize.XL),
-            accent,
-            TextAnchor.RIGHT
-        )
-        header_texts.append(temp)
 
     # Add text to the canvas
     for t in header_texts:
-        draw.text(t.position, t.text, fill=t.colour, font=t.font, anchor=t.anchor)
+        draw_text(canvas, t)
     
     # Adding the tide graph
-    hour, minute = low_tide['time'].hour, low_tide['time'].minute
+    hour, minute = low_tide_time.hour, low_tide_time.minute
     tide_graph_x = tide_graph_x_position(hour, minute)
     canvas.paste(TIDE_GRAPH_IMG, (tide_graph_x, tide_graph_pos_y), mask=TIDE_GRAPH_IMG)
-    
-    # Adding day progress marker ONLY IF INFORMATION IS FOR TODAY
-    if today:
-        time_marker = TIME_MARKER_IMG.copy()
-        canvas.paste(time_marker, ( get_progress_position(), time_marker_pos_y ), mask=time_marker)
 
     # Adding tide markers
-    hi_tide_marker = HI_TIDE_MARKER_IMG.copy()
     canvas.paste(
-        hi_tide_marker,
-        ( get_progress_position(high_tide['time']), tide_marker_pos_y ),
-        mask=hi_tide_marker
+        HI_TIDE_MARKER_IMG,
+        ( get_progress_position(high_tide_time), tide_marker_pos_y ),
+        mask=HI_TIDE_MARKER_IMG
     )
 
-    lo_tide_marker = LO_TIDE_MARKER_IMG.copy()
     canvas.paste(
-        lo_tide_marker,
-        ( get_progress_position(low_tide['time']), tide_marker_pos_y ),
-        mask=lo_tide_marker
+        LO_TIDE_MARKER_IMG,
+        ( get_progress_position(low_tide_time), tide_marker_pos_y ),
+        mask=LO_TIDE_MARKER_IMG
     )
 
     # Adding tide information
     hi_tide_height = Text(
-        high_tide['height'],
-        (get_progress_position(high_tide['time']) + 14, high_tide_pos_y),
+        high_tide_height,
+        (get_progress_position(high_tide_time) + 14, high_tide_pos_y),
         Font(FontStyle.BOLD_CONDENSED, FontSize.XS),
         HI_TIDE_COLOUR,
         TextAnchor.CENTER   
     )
 
     lo_tide_height = Text(
-        low_tide['height'],
-        (get_progress_position(low_tide['time']) + 14, low_tide_pos_y),
+        low_tide_height,
+        (get_progress_position(low_tide_time) + 14, low_tide_pos_y),
         Font(FontStyle.BOLD_CONDENSED, FontSize.XS),
         LO_TIDE_COLOUR,
         TextAnchor.CENTER
@@ -195,62 +226,52 @@ def create_image(date: str, spot_name: str, high_tide: Dict[str, Union[time, str
 
     # Add text to the canvas
     for t in tides:
-        draw.text(t.position, t.text, fill=t.colour, font=t.font, anchor=t.anchor)
-    
-    # Add tide times
-    for t in [high_tide, low_tide]:
-        # text_img = draw_tide_time(t['time'].strftime("%H:%M"))
-        text_img = draw_tide_time(t['time'].strftime("%I:%M"))
-
-        canvas.paste(text_img, (get_progress_position(t['time']) - 2, tide_time_pos_y), mask=text_img)
-
-    # Loading the corresponding weather condition icon
-    icon_name =  weather_codes.WWO_CODE[wwo_code]
-    icon_path = f'{ICONS_DIR}{icon_name}.png'
-    icon = Image.open(icon_path)
-
-    # formatting and pasting weather icon
-    icon_coloured = recolour.recolour(icon, (250, 253, 255), accent_rgb)
-    canvas.paste(icon_coloured, (610, 85), mask=icon_coloured)
-
+        draw_text(canvas, t)
     
-    # DEBUGGING
-    # canvas.save("test.png", "PNG", quality=100)
-    # print(canvas)
+    # Add tide times from the pre-rendered label atlas
+    for t in [high_tide_time, low_tide_time]:
+        TIME_LABELS.paste(canvas, t.strftime("%I:%M"), (get_progress_position(t) - 2, tide_time_pos_y))
 
-    # Saving the created image to memory in BytesIO as a "file-like object" -> https://stackoverflow.com/questions/60006794/send-image-from-memory
-    tide_card = BytesIO()
-    canvas.save(tide_card, format='PNG')
-
-    return tide_card
+    return canvas
 
 
-def draw_tide_time(time: str) -> Image:
+def draw_overlay(canvas: Image, temperature: int = 0, wwo_code: int = 0, today: bool = False, compact: bool = False, now: time = None) -> None:
     '''
-    Draws a text image rotated 90 degrees for the given time.
-
-    Parameters:
-    - time: str
-        The time to draw in the format "HH:MM"
+    Draws the parts of a card that change through the day onto a copy of its base layer: the temperature,
+    the weather icon and, for today, the time marker.
 
-    Returns:
-    - Image
-        The image of the text
+    Args:
+        - canvas (Image): The base layer to draw on, edited in place.
+        - temperature (int): The air temperature at the beach.
+        - wwo_code (int): The WWO code for the weather conditions.
+        - today (bool, optional): Whether the information is for today. Defaults to False.
+        - compact (bool, optional): Whether the image is compact or full-sized. Defaults to False.
+        - now (time, optional): Where to put the time marker. Defaults to the current time.
     '''
-    # Create a new image for the rotated text
-    f = Font(FontStyle.BOLD_CONDENSED, FontSize.XS)
-    t = time
+    time_marker_pos_y = TIME_MARKER_POS_Y if not compact else TIME_MARKER_POS_Y_COMPACT
 
-    # Create temp image
-    rotated_text = Image.new('RGBA', (50, 50))
-    rotated_draw = ImageDraw.Draw(rotated_text)
+    # Getting accent colour
+    accent = weather_codes.ACCENT_COLOUR[weather_codes.WWO_CODE[wwo_code]]
+
+    # Adding the temperature
+    if temperature:
+        temp = Text(
+            f'{temperature}º',
+            (810, 120),
+            Font(FontStyle.BOLD, FontSize.XL),
+            accent,
+            TextAnchor.RIGHT
+        )
+        draw_text(canvas, temp)
 
-    # draw text and rotate the temp image
-    rotated_draw.text((0, 0), t, fill='white', font=f.font)
-    rotated_text = rotated_text.rotate(90, expand=True)
+    # Adding day progress marker ONLY IF INFORMATION IS FOR TODAY
+    if today:
+        canvas.paste(TIME_MARKER_IMG, ( get_progress_position(now), time_marker_pos_y ), mask=TIME_MARKER_IMG)
 
-    # return the rotated text image
-    return rotated_text
+    # Pasting the corresponding weather condition icon, already recoloured with the accent colour
+    icon_name =  weather_codes.WWO_CODE[wwo_code]
+    icon_coloured = weather_icons.get_icon(icon_name, accent)
+    canvas.paste(icon_coloured, (610, 85), mask=icon_coloured)
 
 
 def get_progress_position(time: datetime.time = None) -> int:
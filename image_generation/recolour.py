@@ -4,12 +4,37 @@
 
 from PIL import Image
 import numpy as np
+from typing import List
 
 # re-colour SVG: https://stackoverflow.com/questions/61824128/python-change-color-in-svg-and-export-to-svg-png-pdf
 
 
 
-def recolour(image:Image, old_colour:tuple, new_colour:tuple) -> Image:
+def recolour_array(data: np.ndarray, old_colour: tuple, new_colour: tuple, tolerance: int = 0) -> np.ndarray:
+    '''
+    Re-colours an RGBA numpy array in place, replacing every pixel within `tolerance` of a colour with a new colour.
+
+    Args:
+    - data (np.ndarray): A (..., 4) uint8 array of RGBA pixels, edited in place.
+    - old_colour (tuple): A tuple of (R, G, B) integers representing the RGB colour to be replaced.
+    - new_colour (tuple): A tuple of (R, G, B) integers representing the new RGB colour.
+    - tolerance (int): How far each channel may be from the old colour and still be replaced, so antialiased edges recolour too.
+
+    Returns:
+    - np.ndarray: The same array.
+    '''
+    rgb = data[..., :3]                                                                                 # view of the colour channels, leaving alpha values alone
+
+    if tolerance:
+        replace = (np.abs(rgb.astype(np.int16) - old_colour) <= tolerance).all(axis=-1)
+    else:
+        replace = (rgb == np.array(old_colour, dtype=data.dtype)).all(axis=-1)
+
+    rgb[replace] = new_colour                                                                           # replacing the values that match the current colour with the new desired colour
+
+    return data
+
+def recolour(image:Image, old_colour:tuple, new_colour:tuple, tolerance: int = 0) -> Image:
     '''
     Re-colours an image by replacing all occurrences of a specified RGB colour with a new RGB colour.
 
@@ -17,16 +42,38 @@ def recolour(image:Image, old_colour:tuple, new_colour:tuple) -> Image:
     - image (PIL.Image): The image to be re-coloured.
     - old_colour (tuple): A tuple of (R, G, B) integers representing the RGB colour to be replaced.
     - new_colour (tuple): A tuple of (R, G, B) integers representing the new RGB colour.
+    - tolerance (int): How far each channel may be from the old colour and still be replaced. Defaults to exact matches.
 
     Returns:
     - PIL.Image: The re-coloured image.
     '''
-    data = np.array(image)                                                                              # "data" is a height x width 4-dimensional numpy array
-    r, g, b, a = data.T                                                                                 # temporarily unpack the colour channels for readability
+    data = np.array(image.convert('RGBA'))                                                              # "data" is a height x width x 4 numpy array - the only copy made
+    recolour_array(data, old_colour, new_colour, tolerance)
+
+    return Image.fromarray(data)                                                                        # converts the numpy array back into image format
+
+def recolour_many(images: List[Image.Image], old_colour: tuple, new_colour: tuple, tolerance: int = 0) -> List[Image.Image]:
+    '''
+    Re-colours a set of images in one pass, by running the colour match over all of their pixels at once.
+
+    Args:
+    - images (List[PIL.Image]): The images to be re-coloured. They don't need to be the same size.
+    - old_colour (tuple): A tuple of (R, G, B) integers representing the RGB colour to be replaced.
+    - new_colour (tuple): A tuple of (R, G, B) integers representing the new RGB colour.
+    - tolerance (int): How far each channel may be from the old colour and still be replaced. Defaults to exact matches.
 
-    replace = (r == old_colour[0]) & (g == old_colour[1]) & (b == old_colour[2])                        # replace current colour with desired colour, leaving alpha values alone
-    data[..., :-1][replace.T] = new_colour                                                              # replacing the values that match the current colour with the new desired colour
+    Returns:
+    - List[PIL.Image]: The re-coloured images, in the same order.
+    '''
+    arrays = [np.asarray(image.convert('RGBA')) for image in images]
+    pixels = np.concatenate([a.reshape(-1, 4) for a in arrays])                                         # every pixel of every image in one array
+    recolour_array(pixels, old_colour, new_colour, tolerance)
 
-    image_coloured = Image.fromarray(data)                                                              # converts the numpy array back into image format
+    recoloured = []
+    start = 0
+    for a in arrays:
+        end = start + a.shape[0] * a.shape[1]
+        recoloured.append(Image.fromarray(pixels[start:end].reshape(a.shape)))
+        start = end
 
-    return image_coloured
+    return recoloured
@@ -0,0 +1,143 @@
+### Keeps recently rendered tide cards in memory, so identical requests don't render the same PNG again
+
+### IMPORTS
+import asyncio
+from io import BytesIO
+from collections import OrderedDict
+from datetime import datetime, time
+from typing import Dict, Hashable, Union
+
+from image_generation.renderer import Renderer, RENDERER
+
+### CONSTANTS
+MAX_BYTES = 64 * 1024 * 1024        # total size of the PNGs kept in memory
+MARKER_MINUTES = 5                  # the time marker on today's cards moves in steps of this many minutes
+
+
+class RenderCache:
+    '''
+    LRU cache of rendered tide cards in front of a Renderer.
+
+    Cards are keyed on everything drawn on them. For today's cards the time marker is rounded down to `marker_minutes`,
+    so the same card is served until the marker would move. Concurrent requests for the same card share one render.
+    The least recently used cards are dropped once the cached PNGs add up to more than `max_bytes`.
+
+    Attributes:
+    - stats: dict
+        counters for hits, misses, coalesced requests and evictions, plus the current number of entries and bytes
+    '''
+    def __init__(self, renderer: Renderer = RENDERER, max_bytes: int = MAX_BYTES, marker_minutes: int = MARKER_MINUTES) -> None:
+        self.renderer = renderer
+        self.max_bytes = max_bytes
+        self.marker_minutes = marker_minutes
+        self._cards: OrderedDict[Hashable, bytes] = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+        self.stats = {
+            'hits':         0,
+            'misses':       0,
+            'coalesced':    0,
+            'evictions':    0,
+            'entries':      0,
+            'bytes':        0,
+        }
+
+    def marker_time(self, now: datetime = None) -> time:
+        '''
+        Rounds the current time down to the marker step.
+        '''
+        now = now or datetime.now()
+        minutes = (now.hour * 60 + now.minute) // self.marker_minutes * self.marker_minutes
+
+        return time(minutes // 60, minutes % 60)
+
+    def get(self, key: Hashable) -> bytes | None:
+        '''
+        Returns the PNG of a cached card and marks it as recently used, or None on a miss.
+        '''
+        png = self._cards.get(key)
+        if png is not None:
+            self._cards.move_to_end(key)
+
+        return png
+
+    def put(self, key: Hashable, png: bytes) -> None:
+        '''
+        Caches a rendered card, evicting the least recently used ones if it goes over the byte budget.
+        '''
+        if len(png) > self.max_bytes:
+            return
+
+        if key in self._cards:
+            self.stats['bytes'] -= len(self._cards.pop(key))
+
+        self._cards[key] = png
+        self.stats['bytes'] += len(png)
+
+        while self.stats['bytes'] > self.max_bytes:
+            _, evicted = self._cards.popitem(last=False)
+            self.stats['bytes'] -= len(evicted)
+            self.stats['evictions'] += 1
+
+        self.stats['entries'] = len(self._cards)
+
+    def clear(self) -> None:
+        self._cards.clear()
+        self.stats['entries'] = 0
+        self.stats['bytes'] = 0
+
+    async def render(self, date: str, spot_name: str, high_tide: Dict[str, Union[time, str]], low_tide: Dict[str, Union[time, str]], temperature: int = 0, wwo_code: int = 0, today: bool = False, compact: bool = False) -> BytesIO:
+        '''
+        Returns a tide card from the cache, rendering it first if needed. Takes the same arguments as create_image.
+
+        Returns:
+            BytesIO: The generated image
+        '''
+        now = self.marker_time() if today else None
+        key = (
+            spot_name, date,
+            high_tide['time'], high_tide['height'],
+            low_tide['time'], low_tide['height'],
+            temperature, wwo_code, today, compact, now
+        )
+
+        png = self.get(key)
+        if png is not None:
+            self.stats['hits'] += 1
+            return BytesIO(png)
+
+        # join a render of the same card that's already running
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+        else:
+            self.stats['misses'] += 1
+            task = asyncio.create_task(self._render(key, (date, spot_name, high_tide, low_tide, temperature, wwo_code, today, compact, now)))
+            self._in_flight[key] = task
+
+        # shielded so one cancelled request doesn't cancel the render for everyone else waiting on it
+        png = await asyncio.shield(task)
+
+        return BytesIO(png)
+
+    async def _render(self, key: Hashable, args: tuple) -> bytes:
+        try:
+            card = await self.renderer.render(*args)
+            png = card.getvalue()
+            self.put(key, png)
+            return png
+        finally:
+            del self._in_flight[key]
+
+    def hit_rate(self) -> float:
+        '''
+        Share of requests served without starting a new render.
+        '''
+        served = self.stats['hits'] + self.stats['coalesced']
+        total = served + self.stats['misses']
+
+        return served / total if total else 0.0
+
+
+# Shared render cache used by the bot
+RENDER_CACHE = RenderCache()
@@ -0,0 +1,170 @@
+### Runs create_image off the event loop, in a bounded pool of worker processes (or threads)
+
+### IMPORTS
+import os
+import asyncio
+import time
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Tuple
+
+import metrics
+from image_generation.pill import create_image
+from image_generation.encoder import ENCODE_SECONDS
+
+### CONSTANTS
+WORKERS = os.cpu_count() or 2       # one renderer per core
+MAX_QUEUE = 32                      # renders allowed to wait for a free worker before new ones are refused
+
+# Workers are started from a clean server process rather than forked from the bot, whose other threads
+# (discord.py's heartbeat, aiohttp, asyncio.to_thread) could be holding a lock the child would inherit forever
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class RendererBusy(Exception):
+    '''
+    Raised when the render queue is full and a new card can't be accepted.
+    '''
+
+
+# Runs inside a new worker, so it has its modules imported before the first card
+def _ready() -> None:
+    pass
+
+# Runs inside the worker: renders the image and hands back the raw encoded bytes, since those pickle cheaply,
+# with the total time taken and how much of it went on encoding
+def _render_job(func: Callable[..., BytesIO], args: tuple, kwargs: dict) -> Tuple[bytes, float, float]:
+    ENCODE_SECONDS.set(0.0)
+    start = time.perf_counter()
+    card = func(*args, **kwargs)
+
+    return card.getvalue(), time.perf_counter() - start, ENCODE_SECONDS.get()
+
+
+class Renderer:
+    '''
+    Async front-end for create_image.
+
+    Cards are rendered in a process pool (or a thread pool) so the Pillow and NumPy work never runs on the event loop.
+    At most `workers` cards render at once and at most `max_queue` more can wait; anything beyond that raises RendererBusy.
+
+    Attributes:
+    - stats: dict
+        counters for submitted, rendered, rejected and failed cards, the current queue depth and render times
+    '''
+    def __init__(self, workers: int = WORKERS, max_queue: int = MAX_QUEUE, processes: bool = True) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.processes = processes
+        self._executor: Executor | None = None
+        self._pending = 0
+
+        self.stats = {
+            'submitted':        0,
+            'rendered':         0,
+            'rejected':         0,
+            'failed':           0,
+            'queue_depth':      0,
+            'in_flight':        0,
+            'render_seconds':   0.0,
+            'last_render_ms':   0.0,
+        }
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(START_METHOD))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='renderer')
+
+        return self._executor
+
+    def start(self) -> None:
+        '''
+        Starts every worker now instead of on the first cards - call it before the bot starts its other threads.
+        '''
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_ready)
+
+    @property
+    def pending(self) -> int:
+        '''
+        Number of cards waiting for a worker or currently rendering.
+        '''
+        return self._pending
+
+    async def render(self, *args, **kwargs) -> BytesIO:
+        '''
+        Renders a tide card without blocking the event loop. Takes the same arguments as create_image.
+
+        Returns:
+            BytesIO: The generated image
+
+        Raises:
+            RendererBusy: if the queue is already full
+        '''
+        return await self.run(create_image, *args, **kwargs)
+
+    async def run(self, func: Callable[..., BytesIO], *args, **kwargs) -> BytesIO:
+        '''
+        Runs any image function that returns a BytesIO in the pool - it has to be defined at module level so it can be pickled.
+
+        Returns:
+            BytesIO: The generated image
+
+        Raises:
+            RendererBusy: if the queue is already full
+        '''
+        if self._pending >= self.workers + self.max_queue:
+            self.stats['rejected'] += 1
+            raise RendererBusy(f'Too many tide cards being drawn right now ({self._pending}), try again in a bit dude 🌊')
+
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        self.stats['submitted'] += 1
+        self._update_depth()
+
+        try:
+            png, seconds, encode_seconds = await loop.run_in_executor(self._get_executor(), _render_job, func, args, kwargs)
+        except Exception:
+            self.stats['failed'] += 1
+            raise
+        finally:
+            self._pending -= 1
+            self._update_depth()
+
+        self.stats['rendered'] += 1
+        self.stats['render_seconds'] += seconds
+        self.stats['last_render_ms'] = seconds * 1000
+
+        # tagged with the request that started the render
+        metrics.observe('render', seconds - encode_seconds)
+        metrics.observe('encode', encode_seconds)
+
+        return BytesIO(png)
+
+    def _update_depth(self) -> None:
+        self.stats['in_flight'] = min(self._pending, self.workers)
+        self.stats['queue_depth'] = max(self._pending - self.workers, 0)
+
+    def average_render_ms(self) -> float:
+        '''
+        Mean time spent inside create_image per rendered card, in milliseconds.
+        '''
+        if not self.stats['rendered']:
+            return 0.0
+        return self.stats['render_seconds'] / self.stats['rendered'] * 1000
+
+    def shutdown(self) -> None:
+        '''
+        Stops the worker pool. Cards already rendering still finish, queued ones are cancelled.
+        '''
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Shared renderer used by the bot
+RENDERER = Renderer()
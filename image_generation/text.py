@@ -1,8 +1,13 @@
 ### IMPORTS
 from enum import Enum
+from functools import lru_cache
 from typing import Tuple
+from PIL import Image, ImageDraw, ImageFont
 from image_generation.fonts import Font
 
+### CONSTANTS
+TEXT_CACHE_SIZE = 512   # number of rendered strings kept in memory
+
 # Enum for text anchor pivot
 class TextAnchor(Enum):
     LEFT   = 'lm'
@@ -16,4 +21,31 @@ class Text:
         self.position   = position
         self.font       = font.font
         self.colour     = colour
-        self.anchor     = anchor.value    # https://pillow.readthedocs.io/en/stable/handbook/text-anchors.html
\ No newline at end of file
+        self.anchor     = anchor.value    # https://pillow.readthedocs.io/en/stable/handbook/text-anchors.html
+
+
+### CACHED TEXT RENDERING ###
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def text_mask(text: str, font: ImageFont.FreeTypeFont, anchor: str) -> Tuple[Image.Image, Tuple[int, int]]:
+    '''
+    Rasterises a string once and keeps it as a greyscale mask, so text that repeats on every card
+    (spot names, dates, temperatures) is only pasted afterwards.
+
+    Returns:
+        The mask and its offset from the anchor point
+    '''
+    left, top, right, bottom = font.getbbox(text, anchor=anchor)
+
+    mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)))
+    ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font, anchor=anchor)
+
+    return mask, (left, top)
+
+def draw_text(canvas: Image.Image, text: Text) -> None:
+    '''
+    Draws a Text object onto the canvas through the text mask cache - same result as ImageDraw.text.
+    '''
+    mask, (left, top) = text_mask(text.text, text.font, text.anchor)
+    x, y = text.position
+
+    canvas.paste(text.colour, (int(x) + left, int(y) + top), mask)
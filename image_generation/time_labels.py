@@ -0,0 +1,164 @@
+### Pre-rendered atlas of the rotated tide time labels, so a card never has to load a font or rotate text for them
+
+### IMPORTS
+import os
+from PIL import Image, ImageDraw
+from PIL.PngImagePlugin import PngInfo
+from typing import Dict, Tuple
+
+from image_generation.fonts import Font, FontStyle, FontSize
+
+### CONSTANTS
+ATLAS_FILE = os.path.join(os.path.dirname(__file__), 'cache/time_labels.png')
+LABEL_SIZE = (50, 50)           # size of the temp image each label is drawn on before rotating
+COLUMNS = 60                    # one row of the atlas per hour, one column per minute
+
+# Every label a card can show - the times are drawn as "%I:%M"
+LABELS = [f'{hour:02d}:{minute:02d}' for hour in range(1, 13) for minute in range(60)]
+LABEL_INDEX = {label: i for i, label in enumerate(LABELS)}
+
+
+def draw_tide_time(time: str) -> Image:
+    '''
+    Draws a text image rotated 90 degrees for the given time.
+
+    Parameters:
+    - time: str
+        The time to draw in the format "HH:MM"
+
+    Returns:
+    - Image
+        The image of the text
+    '''
+    # Create a new image for the rotated text
+    f = Font(FontStyle.BOLD_CONDENSED, FontSize.XS)
+    t = time
+
+    # Create temp image
+    rotated_text = Image.new('RGBA', LABEL_SIZE)
+    rotated_draw = ImageDraw.Draw(rotated_text)
+
+    # draw text and rotate the temp image
+    rotated_draw.text((0, 0), t, fill='white', font=f.font)
+    rotated_text = rotated_text.rotate(90, expand=True)
+
+    # return the rotated text image
+    return rotated_text
+
+
+class TimeLabelAtlas:
+    '''
+    All 720 rotated time labels packed into one image.
+
+    Every label is cropped to the area any label actually covers, so the atlas stays small.
+    It's built the first time a label is needed and, if a path is given, saved there and loaded back on the next start.
+    '''
+    def __init__(self, path: str = None) -> None:
+        self.path = path
+        self._atlas: Image = None
+        self._box: Tuple[int, int, int, int] = None       # crop of each label within its 50x50 temp image
+        self._labels: Dict[str, Image] = {}
+
+    @property
+    def cell_size(self) -> Tuple[int, int]:
+        return (self._box[2] - self._box[0], self._box[3] - self._box[1])
+
+    def _build(self) -> None:
+        labels = [draw_tide_time(text) for text in LABELS]
+
+        # the smallest box that fits every label
+        boxes = [label.getbbox() for label in labels]
+        self._box = (
+            min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes)
+        )
+
+        width, height = self.cell_size
+        self._atlas = Image.new('RGBA', (width * COLUMNS, height * len(LABELS) // COLUMNS))
+
+        for i, label in enumerate(labels):
+            self._atlas.paste(label.crop(self._box), (i % COLUMNS * width, i // COLUMNS * height))
+
+    def _load(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+
+        with Image.open(self.path) as atlas:
+            box = atlas.text.get('box')
+            if not box:
+                return False
+
+            self._box = tuple(int(v) for v in box.split(','))
+            self._atlas = atlas.convert('RGBA')
+
+        return True
+
+    def save(self, path: str = None) -> None:
+        '''
+        Writes the atlas to disk as a PNG, with the label crop stored in its metadata.
+        '''
+        path = path or self.path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        info = PngInfo()
+        info.add_text('box', ','.join(str(v) for v in self._box))
+
+        tmp = f'{path}.{os.getpid()}.tmp'       # workers of the render pool may save at the same time
+        self.atlas.save(tmp, format='PNG', pnginfo=info)
+        os.replace(tmp, path)
+
+    @property
+    def atlas(self) -> Image:
+        '''
+        The atlas image, loaded from disk or built on first use.
+        '''
+        if self._atlas is None and not self._load():
+            self._build()
+
+            if self.path:
+                try:
+                    self.save()
+                except OSError as e:
+                    print(f'[time_labels.py] >>> Couldn\'t save the time label atlas: {e}')
+
+        return self._atlas
+
+    def label(self, text: str) -> Image:
+        '''
+        Returns the cropped label for a time in the format "HH:MM" (12 hour clock).
+        '''
+        image = self._labels.get(text)
+
+        if image is None:
+            atlas = self.atlas
+            width, height = self.cell_size
+            i = LABEL_INDEX[text]
+            x, y = i % COLUMNS * width, i // COLUMNS * height
+
+            image = atlas.crop((x, y, x + width, y + height))
+            self._labels[text] = image
+
+        return image
+
+    def paste(self, canvas: Image, text: str, position: Tuple[int, int]) -> None:
+        '''
+        Pastes the label of a time onto the canvas, at the same spot a 50x50 image from draw_tide_time would go.
+
+        Parameters:
+            canvas (Image): The image to paste onto
+            text (str): The time in the format "HH:MM"
+            position (Tuple[int, int]): The top left corner of the 50x50 label image
+        '''
+        # anything outside the 12 hour labels is drawn the slow way
+        if text not in LABEL_INDEX:
+            image = draw_tide_time(text)
+            canvas.paste(image, position, mask=image)
+            return
+
+        image = self.label(text)
+        x, y = position
+        canvas.paste(image, (x + self._box[0], y + self._box[1]), mask=image)
+
+
+# Shared atlas, saved next to the templates
+TIME_LABELS = TimeLabelAtlas(ATLAS_FILE)
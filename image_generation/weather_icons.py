@@ -0,0 +1,76 @@
+### Weather icons, decoded and recoloured once per accent colour and then kept in memory
+
+### IMPORTS
+import os
+from PIL import Image, ImageColor
+from typing import Dict, Iterable, Tuple
+
+from image_generation import recolour
+from weather import weather_codes
+
+### CONSTANTS
+ICONS_DIR = os.path.join(os.path.dirname(__file__), 'icons/')
+ICON_COLOUR = (250, 253, 255)       # colour the icons are drawn in, replaced by the accent colour
+TOLERANCE = 8                       # how far off ICON_COLOUR a pixel can be and still get recoloured
+
+### Caches
+_SOURCES: Dict[str, Image.Image] = {}
+_ICONS: Dict[Tuple[str, str], Image.Image] = {}
+
+
+# Decodes an icon from disk the first time it's needed
+def _source(name: str) -> Image.Image:
+    icon = _SOURCES.get(name)
+
+    if icon is None:
+        with Image.open(f'{ICONS_DIR}{name}.png') as file:
+            icon = file.convert('RGBA')
+        _SOURCES[name] = icon
+
+    return icon
+
+def available() -> list:
+    '''
+    Names of all the icons that exist on disk.
+    '''
+    return sorted(f[:-4] for f in os.listdir(ICONS_DIR) if f.endswith('.png'))
+
+def get_icon(name: str, accent: str) -> Image.Image:
+    '''
+    Returns a weather icon recoloured with an accent colour. Icons are shared, so don't draw on them.
+
+    Parameters:
+        name (str): The icon's name, as in weather_codes.WWO_CODE
+        accent (str): The #Hex accent colour
+
+    Returns:
+        Image: The RGBA icon
+    '''
+    icon = _ICONS.get((name, accent))
+
+    if icon is None:
+        icon = recolour.recolour(_source(name), ICON_COLOUR, ImageColor.getcolor(accent, 'RGB'), TOLERANCE)
+        _ICONS[(name, accent)] = icon
+
+    return icon
+
+def warm(names: Iterable[str] = None, accents: Iterable[str] = None) -> int:
+    '''
+    Builds every icon and accent colour combination in advance, one batch recolour per colour.
+
+    Parameters:
+        names (Iterable[str]): Icons to build, defaults to every icon on disk
+        accents (Iterable[str]): #Hex colours to build, defaults to every colour in weather_codes.ACCENT_COLOUR
+
+    Returns:
+        int: The number of icons in the cache
+    '''
+    names = list(names or available())
+    accents = set(accents or weather_codes.ACCENT_COLOUR.values())
+    sources = [_source(name) for name in names]
+
+    for accent in accents:
+        coloured = recolour.recolour_many(sources, ICON_COLOUR, ImageColor.getcolor(accent, 'RGB'), TOLERANCE)
+        _ICONS.update(((name, accent), icon) for name, icon in zip(names, coloured))
+
+    return len(_ICONS)
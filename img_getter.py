@@ -3,29 +3,58 @@
 ### IMPORTS
 from bs4 import BeautifulSoup
 import requests
+import os
 import random
+import asyncio
+import time
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
 from duckduckgo_search import DDGS
 
+### CONSTANTS
+GOOGLE_URL = os.environ.get('GOOGLE_IMAGES_URL', 'https://www.google.com/search')     # overridable to point at a local stand-in
+MAX_RESULTS = 10            # candidate images kept per search
+TIMEOUT = 10                # seconds allowed for one search
+POOL_TTL = 6 * 60 * 60      # seconds a pool of images is served before it's refreshed in the background
+RETRY_TTL = 5 * 60          # seconds to wait before searching again after a search failed or found nothing
+DDG_WORKERS = 2             # threads for DuckDuckGo searches - a hung one holds its thread even after it's timed out
+WARM_CONCURRENCY = 2        # searches a warm-up runs at once, so filling every spot's pool doesn't get the bot rate-limited
+
+THUMB_FALLBACK = 'https://i.imgur.com/fCyBeda.jpg'
+IMG_FALLBACK = 'https://www.evasoes.pt/files/2020/09/38332521_WEB_54049224_GL31082020MARIAJOAOGALA002_WEB_resultado-960x640.jpg'
+
+
+###### HELPERS #################################################
+# Extracts the image URLs from a Google Images results page
+def parse_google(source: str) -> List[str]:
+    soup = BeautifulSoup(source, 'lxml')
+    urls = [img.get('src') for img in soup.findAll('img')]
+
+    return [url for url in urls if url and url.startswith('http')][:MAX_RESULTS]
+
+# Searches DuckDuckGo and returns the image URLs - blocking
+def search_ddg(search: str) -> List[str]:
+    results = DDGS().images(keywords=search, max_results=MAX_RESULTS, safesearch="off")
+    return [r['image'] for r in results]
+
+
+###### SYNC SEARCHES #################################################
 # Get the thumbnail URL via google search
 def get_thumb(search: str) -> str:
     '''
     Searches Google Images for pictures of a given beach and returns one of them.
 
+    Blocking - the bot uses the THUMBS pool instead.
+
     Returns:
         - URL of the image
     '''
-
-    url = f'https://www.google.com/search?q={search}+beach&tbm=isch'
-    source = requests.get(url).text
-    soup = BeautifulSoup(source, 'lxml')
-
-    results = soup.findAll('img')
-
     try:
-        i = random.randrange(0, 10)
-        image_url = results[i].get('src')
-    except:
-        image_url = 'https://i.imgur.com/fCyBeda.jpg'
+        source = requests.get(GOOGLE_URL, params={'q': f'{search} beach', 'tbm': 'isch'}, timeout=TIMEOUT).text
+        image_url = random.choice(parse_google(source))
+    except Exception:
+        image_url = THUMB_FALLBACK
 
     return image_url
 
@@ -33,20 +62,177 @@ def get_img(search: str) -> str:
     '''
     Searches DuckDuckGo for pictures of a given beach and returns one of them.
 
+    Blocking - the bot uses the IMAGES pool instead.
+
     Returns:
         - URL of the image
     '''
-
     try:
-        results = DDGS().images(keywords=search, max_results=10, safesearch="off")
-        i = random.randrange(0, 10)
-        image_url = results[i]['image']
-    except:
-        # image_url = 'https://i.imgur.com/fCyBeda.jpg'
-        image_url = 'https://www.evasoes.pt/files/2020/09/38332521_WEB_54049224_GL31082020MARIAJOAOGALA002_WEB_resultado-960x640.jpg'
+        image_url = random.choice(search_ddg(search))
+    except Exception:
+        image_url = IMG_FALLBACK
 
     return image_url
 
+
+###### ASYNC SEARCHES #################################################
+class ImageSearch:
+    '''
+    Asyncio image searches. Google pages are fetched over one shared aiohttp session,
+    and DuckDuckGo searches run in threads of their own so they never block the event loop -
+    nor, when one hangs, the default executor the tidal data loads and reply rebuilds use.
+    '''
+    def __init__(self, google_url: str = GOOGLE_URL, timeout: float = TIMEOUT, ddg_workers: int = DDG_WORKERS) -> None:
+        self.google_url = google_url
+        self.timeout = timeout
+        self.ddg_workers = ddg_workers
+        self._session: aiohttp.ClientSession | None = None
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        return self._session
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.ddg_workers, thread_name_prefix='ddg')
+
+        return self._executor
+
+    async def google(self, search: str) -> List[str]:
+        '''
+        Searches Google Images for pictures of a beach.
+
+        Returns:
+            List[str]: URLs of the images found
+        '''
+        params = {'q': f'{search} beach', 'tbm': 'isch'}
+
+        async with self._get_session().get(self.google_url, params=params) as response:
+            response.raise_for_status()
+            source = await response.text()
+
+        return parse_google(source)
+
+    async def duckduckgo(self, search: str) -> List[str]:
+        '''
+        Searches DuckDuckGo for pictures of a beach.
+
+        Returns:
+            List[str]: URLs of the images found
+        '''
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(self._get_executor(), search_ddg, search), self.timeout)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+        # hung searches are left behind rather than waited on
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class ImagePool:
+    '''
+    Keeps a pool of candidate image URLs for every search and hands out a random one.
+
+    A pool is served until its TTL runs out, and then keeps being served while a new search refreshes it in the background,
+    so once a spot is warm an embed costs no outbound requests at all. Only the very first request for a spot waits on a search,
+    and requests that arrive while that search runs share it.
+    '''
+    def __init__(self, fetch: Callable[[str], Awaitable[List[str]]], fallback: str, ttl: float = POOL_TTL, retry_ttl: float = RETRY_TTL) -> None:
+        '''
+        Parameters:
+            fetch (Callable): Coroutine function searching for images, returning a list of URLs
+            fallback (str): The URL handed out when there are no images
+            ttl (float): Seconds a pool is fresh for
+            retry_ttl (float): Seconds to wait before searching again after a failure
+        '''
+        self.fetch = fetch
+        self.fallback = fallback
+        self.ttl = ttl
+        self.retry_ttl = retry_ttl
+
+        self._pools: Dict[str, Tuple[float, List[str]]] = {}       # search -> (expiry time, urls)
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'refreshes': 0, 'failures': 0}
+
+    async def _search(self, search: str) -> List[str]:
+        self.stats['refreshes'] += 1
+
+        try:
+            urls = await self.fetch(search)
+        except Exception as e:
+            print(f'[img_getter.py] >>> Image search for {search} failed: {e}')
+            urls = []
+
+        if urls:
+            self._pools[search] = (time.monotonic() + self.ttl, urls)
+        else:
+            self.stats['failures'] += 1
+            # keep serving the old images, and don't search again straight away
+            _, old = self._pools.get(search, (0, []))
+            self._pools[search] = (time.monotonic() + self.retry_ttl, old)
+
+        return self._pools[search][1]
+
+    def refresh(self, search: str) -> asyncio.Task:
+        '''
+        Starts a search for new images in the background - or returns the one already running.
+        '''
+        task = self._refreshing.get(search)
+
+        if task is None:
+            task = asyncio.create_task(self._search(search))
+            self._refreshing[search] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(search, None))
+
+        return task
+
+    async def get(self, search: str) -> str:
+        '''
+        Returns a random image URL for a search.
+        '''
+        entry = self._pools.get(search)
+
+        if entry is None:
+            self.stats['misses'] += 1
+            urls = await asyncio.shield(self.refresh(search))
+        else:
+            self.stats['hits'] += 1
+            expiry, urls = entry
+            if time.monotonic() >= expiry:
+                self.refresh(search)
+
+        return random.choice(urls) if urls else self.fallback
+
+    async def warm(self, searches: Iterable[str], concurrency: int = WARM_CONCURRENCY) -> None:
+        '''
+        Fills the pools of the given searches, e.g. every spot when the bot starts - a few at a time.
+
+        Searches that already have a pool are skipped, and requests for a spot still waiting its turn search for it themselves.
+        '''
+        limit = asyncio.Semaphore(concurrency)
+
+        async def warm_one(search: str) -> None:
+            async with limit:
+                if search not in self._pools:
+                    await self.refresh(search)
+
+        await asyncio.gather(*(warm_one(search) for search in searches))
+
+
+# Shared searches and pools used by the bot
+SEARCH = ImageSearch()
+THUMBS = ImagePool(SEARCH.google, THUMB_FALLBACK)
+IMAGES = ImagePool(SEARCH.duckduckgo, IMG_FALLBACK)
+
+
 if __name__ == '__main__':
     print(get_thumb('sao pedro de moel'))
-    print(get_img('sao pedro de moel'))
\ No newline at end of file
+    print(get_img('sao pedro de moel'))
@@ -0,0 +1,228 @@
+# Latency histograms and counters for the /tides command, served in the Prometheus text format
+
+### IMPORTS
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from aiohttp import web
+
+### CONSTANTS
+HOST = '127.0.0.1'          # only reachable from the machine the bot runs on
+PORT = int(os.environ.get('METRICS_PORT', 9108))      # overridable when another process has the port
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)     # seconds
+
+# The labels of the request being handled - set once by the command, picked up by every stage it goes through.
+# Tasks copy the context they're created in, so renders and fetches started by a request are tagged with it too.
+REQUEST_LABELS: ContextVar[Dict[str, str]] = ContextVar('request_labels', default={})
+
+
+# Escapes a label value for the text format
+def _escape(value: object) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    '''
+    A named metric with a fixed set of labels. Labels that aren't given are taken from REQUEST_LABELS, or left empty.
+    '''
+    kind = ''
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        context = REQUEST_LABELS.get()
+        return tuple(str(labels.get(n, context.get(n, ''))) for n in self.labels)
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, key)} {value:g}')
+        return lines
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}       # labels -> per-bucket counts, then +Inf count, then sum
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                bucket = _format_labels(self.labels, key, f'le="{le}"')
+                lines.append(f'{self.name}_bucket{bucket} {cumulative}')
+
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {cumulative}')
+
+        return lines
+
+
+class Gauge(Metric):
+    '''
+    A value read from a callback every time the metrics are scraped - e.g. a queue depth.
+    '''
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, func: Callable[[], float]) -> None:
+        super().__init__(name, help)
+        self.func = func
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        try:
+            lines.append(f'{self.name} {float(self.func()):g}')
+        except Exception as e:
+            print(f'[metrics.py] >>> Gauge {self.name} failed: {e}')
+        return lines
+
+
+class Registry:
+    '''
+    Every metric of the bot, rendered together for the /metrics endpoint.
+    '''
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f'metric {metric.name} is already registered')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, func: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help, func))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+### The bot's metrics
+REGISTRY = Registry()
+LABELS = ('spot', 'period', 'type')
+
+STAGE_SECONDS = REGISTRY.histogram('tides_stage_seconds', 'Time spent in each stage of the /tides command', ('stage',) + LABELS)
+STAGE_ERRORS = REGISTRY.counter('tides_stage_errors_total', 'Stages of the /tides command that raised', ('stage',) + LABELS)
+REQUESTS = REGISTRY.counter('tides_requests_total', 'Requests of the /tides command', LABELS)
+
+
+def set_labels(**labels) -> None:
+    '''
+    Tags everything measured from here on in the current task (and the tasks it starts) with these labels.
+    '''
+    REQUEST_LABELS.set({k: str(v) for k, v in labels.items()})
+
+def observe(stage: str, seconds: float, **labels) -> None:
+    '''
+    Records how long a stage took.
+    '''
+    STAGE_SECONDS.observe(seconds, stage=stage, **labels)
+
+@contextmanager
+def stage(name: str, **labels) -> Iterator[None]:
+    '''
+    Times the block as a stage of the current request, counting it as an error if it raises.
+
+        with metrics.stage('weather'):
+            ...
+    '''
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name, **labels)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name, **labels)
+
+
+### ENDPOINT
+async def start_server(host: str = HOST, port: int = PORT, registry: Registry = REGISTRY) -> web.AppRunner:
+    '''
+    Serves the metrics at http://host:port/metrics in the Prometheus text format.
+
+    Returns:
+        web.AppRunner: call its cleanup() to stop the server
+
+    Raises:
+        OSError: if the port can't be bound, e.g. it's already in use
+    '''
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8', headers={'X-Content-Type-Options': 'nosniff'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError:
+        await runner.cleanup()
+        raise
+
+    print(f'[metrics.py] >>> Serving metrics on http://{host}:{port}/metrics')
+
+    return runner
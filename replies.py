@@ -0,0 +1,178 @@
+# Builds the text of the /tides message and embed replies, and keeps them ready between requests
+
+### IMPORTS
+import asyncio
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+import cards
+from data import Day
+from spots import Spot, SPOTS
+from tide_store import TideStore
+from weather import weather_codes
+from weather.cache import WEATHER, Forecast
+
+### CONSTANTS
+PERIODS = ('today', 'tomorrow', 'weekly')
+WEEKLY_DAYS = 7                     # days after today shown by "weekly"
+
+# First line of a reply, by period
+INTROS = {
+    'today':    'Here are the tides at __{}__ today, dude 😎\n',
+    'tomorrow': 'This is what the waves are gonna look like __tomorrow at {}__, dude 🤙\n',
+    'weekly':   'Look at all those waves, bro 🌊\n',
+}
+DEFAULT_INTRO = 'Here are the tides today\n'
+
+# What the weather line is called, by period
+WEATHER_TITLES = {
+    'today':    '\n\nCurrent weather:',
+    'tomorrow': '\n\nWeather forecast:',
+}
+
+
+### FORMATTING
+# First and last date a period covers
+def period_dates(period: str, today: date) -> Tuple[date, date]:
+    match period:
+        case 'tomorrow':
+            tomorrow = today + timedelta(days=1)
+            return (tomorrow, tomorrow)
+        case 'weekly':
+            return (today, today + timedelta(days=WEEKLY_DAYS))
+        case _:
+            return (today, today)
+
+def format_tides(spot_name: str, period: str, days: List[Day]) -> str:
+    '''
+    Writes the tides of the days as the Markdown body of a reply, intro included.
+    '''
+    lines = [INTROS.get(period, DEFAULT_INTRO).format(spot_name)]
+
+    for d in days:
+        formatted_date = d.datetime.strftime("%-d/%-m")
+        lines.append(f"\n**__{d.weekday}__**__ ({formatted_date}):__\n")
+
+        for t in d.tides:
+            icon = '🌊' if t.tide == True else '🏖️'
+            bold = '**' if t.tide == False else ''
+            lines.append(f"{icon}  {bold}{t.time}{bold}  ({t.height})\n")
+
+    return ''.join(lines)
+
+def format_weather(period: str, temp: int, wwo_code: str) -> str:
+    '''
+    Writes the weather line that ends a reply, e.g. "Current weather: **22ºC** // Partly cloudy ⛅"
+    '''
+    conditions = weather_codes.WWO_CODE[wwo_code]
+    weather_icon = weather_codes.WEATHER_SYMBOL[conditions]
+
+    return f'{WEATHER_TITLES[period]} **{temp}ºC** // {conditions} {weather_icon}'
+
+
+### CACHE
+class ReplyCache:
+    '''
+    Ready-made reply text, so answering a message or embed is a dictionary lookup.
+
+    The tide part of a reply is keyed on (spot, period, date) and is rebuilt for every spot whenever the tidal data is refreshed.
+    The weather line is kept apart, keyed on (spot, period), and is only reused while the forecast it was written from is fresh:
+    it's dropped as soon as the weather cache fetches a new forecast for the spot, or rebuilt once the forecast passes its TTL.
+    '''
+    def __init__(self) -> None:
+        self._tides: Dict[Tuple[int, str, date], Tuple[List[Day], str]] = {}
+        self._weather: Dict[Tuple[Tuple[float, float], str], Tuple[Forecast, int, str, str]] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'weather_hits': 0, 'weather_misses': 0, 'rebuilds': 0}
+
+    def tides(self, store: TideStore, spot: Spot, period: str, today: date) -> Tuple[List[Day], str]:
+        '''
+        Returns the days of a period and their formatted tides.
+
+        Parameters:
+            store (TideStore): The tidal data - the entries come from whichever store was current when they were built
+            spot (Spot): The beach
+            period (str): 'today', 'tomorrow' or 'weekly'
+            today (date): Today's date at the beaches
+
+        Returns:
+            Tuple[List[Day], str]: The days and the reply body
+        '''
+        key = (spot.id, period, today)
+        entry = self._tides.get(key)
+
+        if entry is not None:
+            self.stats['hits'] += 1
+            return entry
+
+        self.stats['misses'] += 1
+        days = store.days(spot.id, *period_dates(period, today))
+        entry = (days, format_tides(spot.name, period, days))
+        self._tides[key] = entry
+
+        return entry
+
+    async def weather(self, spot: Spot, period: str) -> Tuple[int, str, str]:
+        '''
+        Returns the temperature, condition code and weather line of a spot for today or tomorrow.
+        '''
+        key = (spot.coordinates, period)
+        entry = self._weather.get(key)
+
+        if entry is not None and entry[0].age() < WEATHER.ttl and WEATHER.is_current(entry[0]):
+            self.stats['weather_hits'] += 1
+            return entry[1:]
+
+        self.stats['weather_misses'] += 1
+        forecast = await WEATHER.forecast(spot.coordinates)
+        temp, wwo_code = forecast.current if period == 'today' else forecast.day(forecast.fetched_on + timedelta(days=1))
+
+        entry = (forecast, temp, wwo_code, format_weather(period, temp, wwo_code))
+        self._weather[key] = entry
+
+        return entry[1:]
+
+    async def weather_updated(self, city: Tuple[float, float], forecast: Forecast) -> None:
+        '''
+        Drops the weather lines of a city that just got a new forecast - registered with the weather cache.
+        '''
+        for period in WEATHER_TITLES:
+            self._weather.pop((city, period), None)
+
+    def build(self, store: TideStore, spots: Iterable[Spot] = SPOTS, today: date = None) -> Dict[Tuple[int, str, date], Tuple[List[Day], str]]:
+        '''
+        Formats a tide entry for today for every spot and period, without touching the cache - safe to run in a worker thread.
+        '''
+        today = today or cards.local_today()
+        tides = {}
+
+        for spot in spots:
+            for period in PERIODS:
+                days = store.days(spot.id, *period_dates(period, today))
+                tides[(spot.id, period, today)] = (days, format_tides(spot.name, period, days))
+
+        return tides
+
+    async def rebuild(self, store: TideStore, spots: Iterable[Spot] = SPOTS, today: date = None) -> int:
+        '''
+        Replaces every tide entry with freshly formatted ones for today, for every spot and period.
+        They're built in a worker thread, so formatting hundreds of spots never blocks the event loop.
+
+        Returns:
+            int: The number of entries built
+        '''
+        tides = await asyncio.to_thread(self.build, store, list(spots), today)
+
+        # swapped in one go on the event loop, so requests never see it half-built
+        self._tides = tides
+        self.stats['rebuilds'] += 1
+
+        return len(tides)
+
+    def clear(self) -> None:
+        self._tides = {}
+        self._weather.clear()
+
+
+# Shared cache used by the bot - its weather lines follow the weather cache
+REPLIES = ReplyCache()
+WEATHER.on_update(REPLIES.weather_updated)
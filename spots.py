@@ -1,4 +1,24 @@
-# Data on all the beach spots supported by the bot
+# Data on all the beach spots supported by the bot - the catalog itself lives in data/spots.json
+
+### IMPORTS
+import os
+import json
+import heapq
+import unicodedata
+from bisect import bisect_left
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Set, Tuple
+
+### CONSTANTS
+SPOTS_FILE = os.path.join(os.path.dirname(__file__), 'data/spots.json')
+MAX_RESULTS = 25            # the most choices Discord shows in an autocomplete
+MAX_SUGGESTIONS = 5         # spots suggested when a typed name isn't recognised
+CANDIDATE_SHARE = 0.25      # share of the query's trigrams a name needs to have to be scored as a fuzzy match
+MAX_CANDIDATES = 50         # the most names scored per fuzzy search, those sharing the most trigrams first
+MIN_SIMILARITY = 0.6        # similarity a name needs to count as a fuzzy match (difflib ratio, 0 to 1)
+RESOLVE_SIMILARITY = 0.75   # similarity a typed name needs to be taken as a spot without picking a suggestion
+MIN_RESOLVE_PREFIX = 3      # shortest typed text that's taken as the start of a spot's name
+
 
 class Spot:
     def __init__(self, name: str, lat: float, lng: float, id: int, url: str) -> None:
@@ -15,12 +35,183 @@ class Spot:
     def coordinates(self) -> tuple[float, float]:
         return (self.lat, self.lng)
 
-SPOTS = [
-    Spot(name='São Pedro de Moel',  lat=39.759, lng=-9.033, id=0, url='https://pt.wisuki.com/tide/2450/sao-pedro-de-moel'),
-    Spot(name='Nazaré',             lat=39.601, lng=-9.071, id=1, url='https://pt.wisuki.com/tide/2434/nazare'),
-    Spot(name='Peniche',            lat=39.356, lng=-9.378, id=2, url='https://pt.wisuki.com/tide/9075/peniche'),
-    Spot(name='Ericeira',           lat=38.963, lng=-9.417, id=3, url='https://pt.wisuki.com/tide/5949/ericeira'),
-    Spot(name='Cascais',            lat=38.696, lng=-9.420, id=4, url='https://pt.wisuki.com/tide/2455/cascais'),
-    Spot(name='Comporta',           lat=38.380, lng=-8.786, id=5, url='https://pt.wisuki.com/tide/2427/comporta')
-]
-    
\ No newline at end of file
+
+### HELPERS
+# Lower case, without accents or punctuation: "São Pedro de Moel" -> "sao pedro de moel"
+def normalise(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).casefold()
+    text = ''.join(c if c.isalnum() else ' ' for c in text)
+
+    return ' '.join(text.split())
+
+# Every run of three characters in the text, padded so the start of each word counts too
+def trigrams(text: str) -> Set[str]:
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def load_spots(filename: str = SPOTS_FILE) -> List[Spot]:
+    '''
+    Reads the spot catalog.
+
+    Returns:
+        List[Spot]: Every spot, in the order of the file
+    '''
+    with open(filename, 'r', encoding='utf-8') as file:
+        return [Spot(s['name'], s['lat'], s['lng'], s['id'], s['url']) for s in json.load(file)]
+
+
+### SEARCH
+class SpotIndex:
+    '''
+    Finds spots by name, ignoring case and accents - "sao pedro" finds "São Pedro de Moel".
+
+    - Prefixes: every word of every name is kept in a sorted list, so the names with a word starting with the query
+      are found with a binary search.
+    - Typos: names sharing enough trigrams with the query are found through a trigram index, and then scored
+      with difflib against the words of the name lined up with the query's - at least MIN_SIMILARITY counts as a match.
+
+    Names starting with the query come first, then names with a later word starting with it, then the fuzzy matches.
+    '''
+    def __init__(self, spots: Iterable[Spot]) -> None:
+        self.spots = list(spots)
+        self.by_id: Dict[int, Spot] = {spot.id: spot for spot in self.spots}
+
+        self._names = [normalise(spot.name) for spot in self.spots]
+        self._alphabetical = sorted(range(len(self.spots)), key=lambda i: self._names[i])
+
+        # (suffix of a name starting at a word, whether it's the whole name, spot index) - sorted for prefix searches
+        suffixes = []
+        for i, name in enumerate(self._names):
+            words = name.split()
+            for w in range(len(words)):
+                suffixes.append((' '.join(words[w:]), w == 0, i))
+        suffixes.sort()
+
+        self._suffixes = [s[0] for s in suffixes]
+        self._suffix_spots = [(s[1], s[2]) for s in suffixes]
+
+        self._trigrams: Dict[str, List[int]] = {}
+        for i, name in enumerate(self._names):
+            for gram in trigrams(name):
+                self._trigrams.setdefault(gram, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.spots)
+
+    def _prefix(self, query: str) -> Tuple[List[int], List[int]]:
+        # names starting with the query, and names with a later word starting with it
+        starts, words = [], []
+        seen = set()
+
+        for j in range(bisect_left(self._suffixes, query), len(self._suffixes)):
+            if not self._suffixes[j].startswith(query):
+                break
+
+            whole, i = self._suffix_spots[j]
+            if i not in seen:
+                seen.add(i)
+                (starts if whole else words).append(i)
+
+        return starts, words
+
+    def _fuzzy(self, query: str, exclude: Set[int]) -> List[Tuple[float, int]]:
+        # (similarity, spot index) of the names close enough to the query, most similar first
+        grams = trigrams(query)
+        if not grams:
+            return []
+
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for i in self._trigrams.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+
+        needed = CANDIDATE_SHARE * len(grams)
+        candidates = heapq.nlargest(MAX_CANDIDATES, (i for i, count in shared.items() if count >= needed and i not in exclude), key=shared.get)
+
+        # difflib caches the second sequence, so the query goes there
+        matcher = SequenceMatcher(b=query, autojunk=False)
+        n_words = len(query.split())
+        matches = []
+
+        for i in candidates:
+            words = self._names[i].split()
+            best = 0.0
+
+            # the query against each run of as many words of the name, e.g. "erciera" against "praia" and "ericeira"
+            for w in range(max(len(words) - n_words + 1, 1)):
+                matcher.set_seq1(' '.join(words[w:w + n_words]))
+                if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best:
+                    best = max(best, matcher.ratio())
+
+            if best >= MIN_SIMILARITY:
+                matches.append((best, i))
+
+        matches.sort(key=lambda m: (-m[0], self._names[m[1]]))
+
+        return matches
+
+    def search(self, query: str, limit: int = MAX_RESULTS) -> List[Spot]:
+        '''
+        Finds the spots whose name best matches what's been typed so far.
+
+        Parameters:
+            query (str): The text typed, in any case and with or without accents
+            limit (int): The most spots to return
+
+        Returns:
+            List[Spot]: The best matches first - the first spots alphabetically if nothing's been typed
+        '''
+        query = normalise(query)
+
+        if not query:
+            return [self.spots[i] for i in self._alphabetical[:limit]]
+
+        starts, words = self._prefix(query)
+        found = sorted(starts, key=lambda i: self._names[i]) + sorted(words, key=lambda i: self._names[i])
+
+        if len(found) < limit:
+            found += [i for _, i in self._fuzzy(query, set(found))]
+
+        return [self.spots[i] for i in found[:limit]]
+
+    def resolve(self, value: str) -> Spot | None:
+        '''
+        Turns the value of the spot option into a Spot - the id of an autocomplete choice,
+        or whatever name was typed if no choice was picked.
+
+        A typed name is only taken if it can't mean anything else: the whole name, the start of a single spot's name,
+        or a clear best fuzzy match. Anything else returns None, so the user can be shown suggestions (see search).
+        '''
+        value = value.strip()
+
+        if value.isdigit() and int(value) in self.by_id:
+            return self.by_id[int(value)]
+
+        query = normalise(value)
+        if not query:
+            return None
+
+        starts, words = self._prefix(query)
+
+        for i in starts:
+            if self._names[i] == query:
+                return self.spots[i]
+
+        if starts or words:
+            found = starts + words
+            return self.spots[found[0]] if len(found) == 1 and len(query) >= MIN_RESOLVE_PREFIX else None
+
+        matches = self._fuzzy(query, set())
+        if matches and matches[0][0] >= RESOLVE_SIMILARITY and (len(matches) == 1 or matches[1][0] < matches[0][0]):
+            return self.spots[matches[0][1]]
+
+        return None
+
+
+# The catalog used by the bot
+SPOTS = load_spots()
+INDEX = SpotIndex(SPOTS)
@@ -1,26 +1,83 @@
 ### IMPORTS
 from bs4 import BeautifulSoup
 import requests
+from requests.adapters import HTTPAdapter
 import lxml
-from typing import List
-import pickle
+from lxml import etree, html
+from typing import Dict, List
+import os
+import json
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
+import tide_format
 from data import Tide, Day
 from spots import Spot, SPOTS
 
+### CONSTANTS
+MAX_CONCURRENCY = 16                                                    # pages fetched at the same time by scrape_all
+TIMEOUT = 20                                                            # seconds allowed per page
+HTTP_CACHE = os.path.join(tide_format.DATA_DIR, 'http_cache.json')      # ETag / Last-Modified of every page scraped
+PARSER = 'bs4'                                                          # default parser backend - 'bs4' or 'lxml'
+
+### Compiled XPath queries for the lxml parser
+DAY_ROWS_XPATH = etree.XPath('(//tbody)[1]//tr')
+CELLS_XPATH = etree.XPath('.//td')
+
+
+### HELPERS
+# Creates a session whose connection pool can hold one keep-alive connection per concurrent fetch
+def make_session(pool_size: int = MAX_CONCURRENCY) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+# Path to the file holding a spot's data for the current month
+def data_filename(location: Spot) -> str:
+    f_date = datetime.now().strftime("%m%y")            # current month and year as 0724
+    return os.path.join(tide_format.DATA_DIR, tide_format.COLUMNS_FILE.format(f_date, location.id))
+
+def load_http_cache(filename: str = HTTP_CACHE) -> Dict[str, Dict[str, str]]:
+    if not os.path.exists(filename):
+        return {}
+
+    with open(filename, 'r') as file:
+        return json.load(file)
+
+def save_http_cache(cache: Dict[str, Dict[str, str]], filename: str = HTTP_CACHE) -> None:
+    tmp = f'{filename}.tmp'
+    with open(tmp, 'w') as file:
+        json.dump(cache, file, indent=2)
+    os.replace(tmp, filename)
+
+
+# Lists the child nodes of an lxml element the way BeautifulSoup's .contents does: text and elements, in order
+def _contents(element: etree._Element) -> list:
+    contents = [element.text] if element.text else []
+
+    for child in element:
+        contents.append(child)
+        if child.tail:
+            contents.append(child.tail)
+
+    return contents
+
+# Text of a node from _contents - like .text in BeautifulSoup
+def _text(node) -> str:
+    return node if isinstance(node, str) else node.text_content()
+
 
 ### FUNCTIONS
-def scrape_data(location: Spot = SPOTS[0]) -> List[Day]:
+def parse_days_bs4(source: str) -> List[Day]:
     '''
-    Scrapes all tidal data for the entire month, and saves into Day objects.
+    Extracts every day of tides from the source code of a wisuki.com tide page, using BeautifulSoup.
 
     Returns:
         List of Day objects
     '''
-    # getting the website source code
-    source = requests.get(location.url).text
-
     # creating html parser object
     soup = BeautifulSoup(source, 'lxml')
 
@@ -69,24 +126,179 @@ def scrape_data(location: Spot = SPOTS[0]) -> List[Day]:
 
         # Create Day object with all the info extracted
         d = Day(date, weekday, tides)
+
+        days_list.append(d)
+
+    return days_list
+
+def parse_days_lxml(source: str) -> List[Day]:
+    '''
+    Extracts every day of tides from the source code of a wisuki.com tide page, using lxml and compiled XPath.
+
+    Gives exactly the same days as parse_days_bs4, without building a BeautifulSoup tree.
+
+    Returns:
+        List of Day objects
+    '''
+    document = html.fromstring(source)
+    days_list = []
+
+    # every non-empty row of the first table body is a day
+    for day in DAY_ROWS_XPATH(document):
+        if not day.text_content().strip():
+            continue
+
+        rows = CELLS_XPATH(day)
+        contents = _contents(rows[0])
+
+        # weekend rows begin with a strong tag
+        if getattr(contents[1], 'tag', None) == 'strong':
+            contents = _contents(contents[1])
+
+        weekday = _text(contents[-1]).strip()
+        date = _text(contents[-2]).strip()
+
+        # extract tides and create Tide objects
+        tides = []
+        for i in range(1, 5):
+            cell = _contents(rows[i])
+            if not cell:
+                break
+
+            tide, time, height, _ = [_text(item).strip() for item in cell[::2]]
+            tides.append(Tide(tide == '▲', time, height))
+
+        days_list.append(Day(date, weekday, tides))
+
+    return days_list
+
+PARSERS = {
+    'bs4':  parse_days_bs4,
+    'lxml': parse_days_lxml,
+}
+
+def parse_days(source: str, parser: str = None) -> List[Day]:
+    '''
+    Extracts every day of tides from the source code of a wisuki.com tide page.
+
+    Parameters:
+        source (str): The page's HTML
+        parser (str): 'bs4' or 'lxml', defaults to PARSER
+
+    Returns:
+        List of Day objects
+    '''
+    days_list = PARSERS[parser or PARSER](source)
+
+    for d in days_list:
         print(d)
         print('\n')
 
-        days_list.append(d)
-    
-    # Get current month and year as 0724
-    current_date = datetime.now()
-    f_date = current_date.strftime("%m%y")
+    return days_list
+
+def save_days(location: Spot, days_list: List[Day]) -> str:
+    '''
+    Saves a spot's days for the current month to disk in the columnar format.
+
+    Returns:
+        The path of the file written
+    '''
+    filename = data_filename(location)
+    tide_format.save(tide_format.days_to_columns(location.id, days_list), filename)
+
+    return filename
+
+def scrape_data(location: Spot = SPOTS[0], session: requests.Session = None) -> List[Day]:
+    '''
+    Scrapes all tidal data for the entire month, and saves into Day objects.
+
+    Returns:
+        List of Day objects
+    '''
+    # getting the website source code
+    source = (session or requests).get(location.url, timeout=TIMEOUT).text
+
+    days_list = parse_days(source)
 
     # Save the data to disk
-    filename = f'data/tides_{f_date}_{location.id}.pickle'
-    with open(filename, 'wb') as file:
-        pickle.dump(days_list, file)
+    save_days(location, days_list)
 
     # Return the data
     return days_list
 
+def scrape_if_modified(location: Spot, session: requests.Session, validators: Dict[str, str]) -> List[Day] | None:
+    '''
+    Scrapes a spot with a conditional request, so pages that haven't changed since the last scrape aren't downloaded again.
+
+    Parameters:
+        location (Spot): The spot to scrape
+        session (requests.Session): The shared session
+        validators (Dict[str, str]): The ETag and Last-Modified saved from the previous scrape, updated in place
+
+    Returns:
+        List of Day objects, or None if the page hasn't changed
+    '''
+    headers = {}
+
+    # only ask for a 304 if this month's file is already on disk
+    if os.path.exists(data_filename(location)):
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'last_modified' in validators:
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    response = session.get(location.url, headers=headers, timeout=TIMEOUT)
+
+    if response.status_code == 304:
+        print(f'[tidal_scraper.py] >>> {location.name} unchanged')
+        return None
+
+    response.raise_for_status()
+
+    days_list = parse_days(response.text)
+    save_days(location, days_list)
+
+    # remember the new validators for the next scrape
+    validators.clear()
+    if 'ETag' in response.headers:
+        validators['etag'] = response.headers['ETag']
+    if 'Last-Modified' in response.headers:
+        validators['last_modified'] = response.headers['Last-Modified']
+
+    return days_list
+
+def scrape_all(spots: List[Spot] = SPOTS, concurrency: int = MAX_CONCURRENCY) -> Dict[int, List[Day] | None]:
+    '''
+    Scrapes every spot concurrently over one shared connection pool, skipping pages that haven't changed.
+
+    Parameters:
+        spots (List[Spot]): The spots to scrape
+        concurrency (int): Max number of pages fetched at the same time
+
+    Returns:
+        Dict of spot id to its list of Day objects - None if the page was unchanged or failed to scrape
+    '''
+    http_cache = load_http_cache()
+    session = make_session(concurrency)
+    results = {}
+
+    def scrape(location: Spot) -> List[Day] | None:
+        validators = http_cache.setdefault(location.url, {})
+        try:
+            return scrape_if_modified(location, session, validators)
+        except Exception as e:
+            print(f'[tidal_scraper.py] >>> Failed to scrape {location.name}: {e}')
+            return None
+
+    with session, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for location, days_list in zip(spots, pool.map(scrape, spots)):
+            results[location.id] = days_list
+
+    save_http_cache(http_cache)
+
+    return results
+
 
 ### MAIN
 if __name__ == '__main__':
-    scrape_data()
\ No newline at end of file
+    scrape_all()
@@ -0,0 +1,192 @@
+# Compact columnar file format for the scraped tidal data
+#
+# Every tide is one row of a NumPy structured array, saved as a .npy file so it can be memory-mapped:
+#   spot    - spot id
+#   minute  - minutes since the Unix epoch (UTC)
+#   high    - True for a high tide, False for a low tide
+#   height  - height of the tide in metres
+
+### IMPORTS
+import os
+import glob
+import pickle
+import numpy as np
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+from data import Tide, Day, timezone
+
+### CONSTANTS
+DATA_DIR = 'data'
+COLUMNS_FILE = 'tides_{}_{}.npy'        # month as 0724, spot id
+
+DTYPE = np.dtype([
+    ('spot',    '<u2'),
+    ('minute',  '<i4'),
+    ('high',    '?'),
+    ('height',  '<f4'),
+])
+
+MINUTES_PER_DAY = 24 * 60
+EPOCH = date(1970, 1, 1)
+SINGLE_CHANGE_DAYS = 140                # Lisbon's clocks never change twice within this many days
+
+# Weekday names as written on wisuki.com, Monday first
+WEEKDAYS = ['Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 'Sexta-feira', 'Sábado', 'Domingo']
+
+
+### CONVERSION
+def days_to_columns(spot_id: int, days: Iterable[Day]) -> np.ndarray:
+    '''
+    Flattens the tides of a spot's days into rows of the columnar format.
+
+    Parameters:
+        spot_id (int): The id of the spot the days belong to
+        days (Iterable[Day]): The days to convert
+
+    Returns:
+        np.ndarray: One row per tide, sorted by time
+    '''
+    rows = []
+
+    for d in days:
+        for t in d.tides:
+            local = timezone.localize(datetime.combine(d.datetime, t.datetime))
+            rows.append((spot_id, int(local.timestamp()) // 60, t.tide, t.height_m))
+
+    columns = np.array(rows, dtype=DTYPE)
+    columns.sort(order=['spot', 'minute'])
+
+    return columns
+
+# Offset of the beaches' clock from UTC during an hour since the epoch, in minutes - clocks only change on the hour
+@lru_cache(maxsize=4096)
+def _hour_offset(hour: int) -> int:
+    return int(datetime.fromtimestamp(hour * 3600, timezone).utcoffset().total_seconds()) // 60
+
+# Offset of the beaches' clock from UTC at a time in epoch minutes, in minutes
+def _utc_offset(minute: int) -> int:
+    return _hour_offset(int(minute) // 60)
+
+# Epoch minutes (UTC) of the beaches' midnight at the start of a date
+@lru_cache(maxsize=1024)
+def date_minutes(day: date) -> int:
+    return int(timezone.localize(datetime.combine(day, time.min)).timestamp()) // 60
+
+def local_minutes(minutes: np.ndarray) -> np.ndarray:
+    '''
+    Converts sorted times in epoch minutes (UTC) to the beaches' local clock, counted from the same epoch.
+
+    Clocks change at most once in less than SINGLE_CHANGE_DAYS, so if a shorter range has the same offset at both ends
+    it has no clock change in it and the whole array is shifted at once. Anything else is converted row by row.
+    '''
+    minutes = np.asarray(minutes, dtype=np.int64)
+    if not len(minutes):
+        return minutes
+
+    first, last = int(minutes[0]), int(minutes[-1])
+    offset = _utc_offset(first)
+
+    if last - first < SINGLE_CHANGE_DAYS * MINUTES_PER_DAY and _utc_offset(last) == offset:
+        return minutes + offset
+
+    return np.array([m + _utc_offset(m) for m in minutes.tolist()], dtype=np.int64)
+
+def columns_to_days(columns: np.ndarray) -> Dict[int, List[Day]]:
+    '''
+    Rebuilds Day objects from rows of the columnar format, grouping the tides by spot and local date.
+
+    Parameters:
+        columns (np.ndarray): Rows sorted by spot and time
+
+    Returns:
+        Dict[int, List[Day]]: The days of each spot, in order
+    '''
+    days = {}
+    if not len(columns):
+        return days
+
+    spots = columns['spot']
+    spot_ids = [int(spots[0])] if spots[0] == spots[-1] else np.unique(spots).tolist()
+
+    for spot_id in spot_ids:
+        spot_rows = columns if len(spot_ids) == 1 else columns[spots == spot_id]
+
+        local = local_minutes(spot_rows['minute'])
+        day_numbers = (local // MINUTES_PER_DAY).tolist()
+        day_minutes = (local % MINUTES_PER_DAY).tolist()
+        highs = spot_rows['high'].tolist()
+        heights = spot_rows['height'].tolist()
+
+        spot_days = []
+        tides = []
+
+        for i, day_number in enumerate(day_numbers):
+            # heights are stored as float32, rounded back to the centimetres they were scraped with
+            tides.append(Tide.from_values(highs[i], day_minutes[i], round(heights[i], 2)))
+
+            # the last tide of a date closes off its day
+            if i + 1 == len(day_numbers) or day_numbers[i + 1] != day_number:
+                day = EPOCH + timedelta(days=day_number)
+                spot_days.append(Day.from_date(day, WEEKDAYS[day.weekday()], tides))
+                tides = []
+
+        days[int(spot_id)] = spot_days
+
+    return days
+
+
+### FILES
+def save(columns: np.ndarray, filename: str) -> None:
+    '''
+    Writes rows of the columnar format to a .npy file.
+
+    The rows go to a temporary file that's then renamed over the old one, so readers never see a half-written file.
+    '''
+    tmp = f'{filename}.tmp'
+    with open(tmp, 'wb') as file:
+        np.save(file, columns.astype(DTYPE, copy=False))
+    os.replace(tmp, filename)
+
+def load(filename: str) -> np.ndarray:
+    '''
+    Memory-maps a .npy tides file. Nothing is copied into memory until the rows are read.
+
+    Returns:
+        np.memmap: The read-only rows of the file
+    '''
+    columns = np.load(filename, mmap_mode='r')
+
+    if columns.dtype != DTYPE:
+        raise ValueError(f'{filename} is not a tides file (dtype {columns.dtype})')
+
+    return columns
+
+def convert_pickles(data_dir: str = DATA_DIR) -> List[str]:
+    '''
+    Converts every pickled tides_MMYY_<id>.pickle file in the data folder into the columnar format, next to it.
+
+    Returns:
+        List[str]: The .npy files written
+    '''
+    written = []
+
+    for pickle_file in sorted(glob.glob(os.path.join(data_dir, 'tides_*_*.pickle'))):
+        f_date, spot_id = os.path.basename(pickle_file)[len('tides_'):-len('.pickle')].split('_')
+
+        with open(pickle_file, 'rb') as file:
+            days = pickle.load(file)
+
+        filename = os.path.join(data_dir, COLUMNS_FILE.format(f_date, spot_id))
+        save(days_to_columns(int(spot_id), days), filename)
+        written.append(filename)
+
+        print(f'[tide_format.py] >>> {pickle_file} -> {filename}')
+
+    return written
+
+
+### MAIN
+if __name__ == '__main__':
+    convert_pickles()
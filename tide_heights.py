@@ -0,0 +1,128 @@
+# Water height between the high and low tides, interpolated from the scraped tide times and heights
+
+### IMPORTS
+import time
+import numpy as np
+from typing import Callable, Dict, Tuple
+
+### CONSTANTS
+MINUTES_PER_DAY = 24 * 60
+SPOT_STRIDE = 1 << 32               # spot id * SPOT_STRIDE + minute sorts every spot's tides into one array
+MAX_TIDE_GAP = 9 * 60               # minutes between two tides past which data must be missing - they're ~6h12m apart
+
+# Rule of twelfths: share of the rise (or fall) done by the end of each sixth of the time between two tides
+TWELFTHS = np.array([0, 1, 3, 6, 9, 11, 12]) / 12
+
+
+###### MODELS ###################################################
+# Each model maps how far we are from one tide to the next (0 to 1) to how much of the height change has happened (0 to 1)
+def cosine_fraction(phase: np.ndarray) -> np.ndarray:
+    return (1 - np.cos(np.pi * phase)) / 2
+
+def twelfths_fraction(phase: np.ndarray) -> np.ndarray:
+    return np.interp(phase * 6, np.arange(7), TWELFTHS)
+
+MODELS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'cosine':   cosine_fraction,
+    'twelfths': twelfths_fraction,
+}
+
+
+###### INTERPOLATION ###################################################
+def interpolate(t0: np.ndarray, t1: np.ndarray, h0: np.ndarray, h1: np.ndarray, minutes: np.ndarray, model: str = 'cosine') -> np.ndarray:
+    '''
+    Water height at any number of times, each between a tide at t0 with height h0 and the next one at t1 with height h1.
+
+    Times outside of their pair of tides get the height of the nearest one, and so does a pair of tides at the same time.
+
+    Parameters:
+        t0, t1 (np.ndarray): Times of the tide before and after each sample
+        h0, h1 (np.ndarray): Their heights
+        minutes (np.ndarray): The times to get the height at, on the same scale
+        model (str): 'cosine' for half a cosine wave between tides, or 'twelfths' for the rule of twelfths
+
+    Returns:
+        np.ndarray: The heights, same shape as `minutes`
+    '''
+    span = np.asarray(t1 - t0, dtype=np.float64)
+    phase = np.divide(minutes - t0, span, out=np.ones(np.broadcast(minutes, span).shape), where=span > 0)
+
+    return h0 + (h1 - h0) * MODELS[model](np.clip(phase, 0, 1))
+
+
+###### BATCHED LOOKUPS ###################################################
+# Current time in minutes since the Unix epoch, the timescale of the tides files
+def now_minutes() -> int:
+    return int(time.time()) // 60
+
+class TideHeights:
+    '''
+    Water height and direction at any spots and times, interpolated between the high and low tides around each time.
+
+    The tides of every spot live in one array sorted by (spot, time), so a whole batch of lookups is a single
+    searchsorted plus a few vectorised operations - no Python loop per spot or per time.
+    '''
+    def __init__(self, columns: np.ndarray) -> None:
+        '''
+        Parameters:
+            columns (np.ndarray): Tides in the columnar format of tide_format, for any number of spots
+        '''
+        columns = np.sort(np.asarray(columns), order=['spot', 'minute'])
+
+        self.spots = columns['spot'].astype(np.int64)
+        self.minutes = columns['minute'].astype(np.int64)
+        self.heights = columns['height'].astype(np.float64)
+        self.keys = self.spots * SPOT_STRIDE + self.minutes
+
+    @classmethod
+    def from_store(cls, store) -> 'TideHeights':
+        '''
+        Builds the lookup arrays straight from the columns of a TideStore.
+        '''
+        return cls(store.columns())
+
+    def at(self, spot_ids, minutes, model: str = 'cosine') -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Water heights for pairs of spot and time.
+
+        Parameters:
+            spot_ids (array-like): Spot ids, or a single one for every time
+            minutes (array-like): Times in minutes since the Unix epoch, or a single one for every spot
+            model (str): 'cosine', or 'twelfths' for the rule of twelfths
+
+        Returns:
+            The heights in metres (NaN where there's no tide on both sides of the time for that spot,
+            or where the tides around it are more than MAX_TIDE_GAP apart because data is missing)
+            and whether the tide is rising at each time
+        '''
+        spot_ids, minutes = np.broadcast_arrays(np.asarray(spot_ids, dtype=np.int64), np.asarray(minutes, dtype=np.int64))
+        heights = np.full(spot_ids.shape, np.nan)
+        rising = np.zeros(spot_ids.shape, dtype=bool)
+
+        if len(self.keys) < 2:
+            return heights, rising
+
+        # last tide at or before each query, so the query is between tide i and tide i + 1
+        keys = spot_ids * SPOT_STRIDE + minutes
+        i = np.clip(np.searchsorted(self.keys, keys, side='right') - 1, 0, len(self.keys) - 2)
+
+        # exactly on a spot's last tide, which has no next one: use the pair ending on it instead
+        i -= (self.keys[i] == keys) & (self.spots[i + 1] != spot_ids) & (i > 0)
+        valid = (self.keys[i] <= keys) & (keys <= self.keys[i + 1]) & (self.spots[i] == spot_ids) & (self.spots[i + 1] == spot_ids)
+        valid &= self.minutes[i + 1] - self.minutes[i] <= MAX_TIDE_GAP
+
+        h0, h1 = self.heights[i], self.heights[i + 1]
+
+        heights[valid] = interpolate(self.minutes[i], self.minutes[i + 1], h0, h1, minutes, model)[valid]
+        rising[valid] = (h1 > h0)[valid]
+
+        return heights, rising
+
+    def now(self, spot_ids = None, model: str = 'cosine') -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Water heights right now, for the given spots or every spot with data.
+        '''
+        if spot_ids is None:
+            spot_ids = np.unique(self.spots)
+
+        return self.at(spot_ids, now_minutes(), model)
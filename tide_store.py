@@ -0,0 +1,256 @@
+# In-memory index of the scraped tidal data, used by the bot to look up days
+
+### IMPORTS
+import os
+import time
+import pickle
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+import tide_format
+from data import Day
+from spots import SPOTS
+
+### CONSTANTS
+DATA_DIR = tide_format.DATA_DIR
+COLUMNS_FILE = tide_format.COLUMNS_FILE
+PICKLE_FILE = 'tides_{}_{}.pickle'      # month as 0724, spot id - older months not converted yet
+MIN_MINUTE, MAX_MINUTE = np.iinfo(tide_format.DTYPE['minute']).min, np.iinfo(tide_format.DTYPE['minute']).max
+
+
+# Returns the first day of each month from `before` months ago until `after` months ahead
+def months_around(today: date, before: int = 1, after: int = 1) -> List[date]:
+    months = []
+
+    for offset in range(-before, after + 1):
+        month_index = today.year * 12 + today.month - 1 + offset
+        months.append(date(month_index // 12, month_index % 12 + 1, 1))
+
+    return months
+
+# Paths of the data files a spot could have for a month - columnar first, then the old pickle
+def month_files(month: date, spot_id: int, data_dir: str = DATA_DIR) -> Tuple[str, str]:
+    f_date = month.strftime("%m%y")
+    return (
+        os.path.join(data_dir, COLUMNS_FILE.format(f_date, spot_id)),
+        os.path.join(data_dir, PICKLE_FILE.format(f_date, spot_id)),
+    )
+
+
+class TideStore:
+    '''
+    Tidal data for every spot, kept in the columnar format of tide_format.
+
+    Each spot's tides are one or more arrays sorted by time - for the .npy files those are the memory-mapped files themselves,
+    so loading a month only reads the file headers and the store holds no Python objects per tide.
+    Looking up a range of dates (like "weekly", even across months) is a binary search on the time column,
+    and only the tides in that range are turned into Day objects.
+    '''
+    def __init__(self) -> None:
+        self._segments: Dict[int, List[np.ndarray]] = {}      # spot id -> arrays of its tides, oldest first
+
+    def __len__(self) -> int:
+        '''
+        Number of tides stored.
+        '''
+        return sum(len(segment) for segments in self._segments.values() for segment in segments)
+
+    def add_columns(self, columns: np.ndarray) -> None:
+        '''
+        Adds rows of the columnar tides format, sorted by spot and time. A single-spot file is kept as it is, without copying.
+        '''
+        if not len(columns):
+            return
+
+        spots = columns['spot']
+        spot_ids = [int(spots[0])] if spots[0] == spots[-1] else np.unique(spots).tolist()
+
+        for spot_id in spot_ids:
+            rows = columns if len(spot_ids) == 1 else columns[spots == spot_id]
+            segments = self._segments.setdefault(spot_id, [])
+            segments.append(rows)
+            segments.sort(key=lambda segment: int(segment['minute'][0]))
+
+    def add(self, spot_id: int, days: Iterable[Day]) -> None:
+        '''
+        Adds days of tides for a spot, e.g. from an old pickle file.
+        '''
+        self.add_columns(tide_format.days_to_columns(spot_id, days))
+
+    def spot_ids(self) -> List[int]:
+        '''
+        Ids of every spot with data.
+        '''
+        return sorted(self._segments)
+
+    def columns(self, spot_id: int = None) -> np.ndarray:
+        '''
+        Every row of a spot, or of all spots, in the columnar format - sorted by spot and time.
+        '''
+        spot_ids = self.spot_ids() if spot_id is None else [spot_id]
+        segments = [segment for s in spot_ids for segment in self._segments.get(s, [])]
+
+        return np.concatenate(segments) if segments else np.empty(0, dtype=tide_format.DTYPE)
+
+    def rows(self, spot_id: int, start: date, end: date) -> np.ndarray:
+        '''
+        The rows of a spot's tides from the start of `start` to the end of `end`, in the beaches' local time.
+        '''
+        # clamped to what the time column can hold, so date.min and date.max mean "everything"
+        first = max(tide_format.date_minutes(start), MIN_MINUTE) if start > date.min else MIN_MINUTE
+        last = min(tide_format.date_minutes(end + timedelta(days=1)), MAX_MINUTE) if end < date.max else MAX_MINUTE
+
+        rows = []
+        for segment in self._segments.get(spot_id, []):
+            minutes = segment['minute']
+            i, j = np.searchsorted(minutes, (first, last), side='left')
+            if i < j:
+                rows.append(segment[i:j])
+
+        if not rows:
+            return np.empty(0, dtype=tide_format.DTYPE)
+        return rows[0] if len(rows) == 1 else np.concatenate(rows)
+
+    def days(self, spot_id: int, start: date, end: date) -> List[Day]:
+        '''
+        Returns the days of a spot from start to end (both included), in order.
+        '''
+        return tide_format.columns_to_days(self.rows(spot_id, start, end)).get(spot_id, [])
+
+    def day(self, spot_id: int, day: date) -> Day | None:
+        '''
+        Returns the tides of a spot on the given date, or None if there's no data for it.
+        '''
+        days = self.days(spot_id, day, day)
+        return days[0] if days else None
+
+    @classmethod
+    def load(cls, months: Iterable[date], data_dir: str = DATA_DIR) -> 'TideStore':
+        '''
+        Reads the data of every spot for the given months. Months that haven't been scraped are skipped.
+
+        The columnar files are memory-mapped and used as they are when they exist, falling back to the old pickle files.
+
+        Parameters:
+            months (Iterable[date]): any date within each month to load, oldest first
+            data_dir (str): the folder with the data files
+
+        Returns:
+            TideStore: a store with all the days found
+        '''
+        store = cls()
+
+        for month in months:
+            for spot in SPOTS:
+                columns_file, pickle_file = month_files(month, spot.id, data_dir)
+
+                if os.path.exists(columns_file):
+                    store.add_columns(tide_format.load(columns_file))
+
+                elif os.path.exists(pickle_file):
+                    with open(pickle_file, 'rb') as file:
+                        store.add(spot.id, pickle.load(file))
+
+        return store
+
+
+class DataRefresher:
+    '''
+    Keeps the bot's TideStore up to date with the data files on disk.
+
+    Every refresh builds a whole new store in a worker thread and then swaps it in with a single assignment,
+    so commands already running keep the store they started with and never see a half-loaded one.
+    A refresh is skipped if the months to load and their files haven't changed since the last one.
+    '''
+    def __init__(self, before: int = 0, after: int = 1, data_dir: str = DATA_DIR, today: Callable[[], date] = None) -> None:
+        '''
+        Parameters:
+            before (int): how many past months to load
+            after (int): how many months ahead to load - the next month keeps "weekly" whole at the end of a month
+            data_dir (str): the folder with the data files
+            today (Callable[[], date]): returns the current date, defaults to the system date
+        '''
+        self.before = before
+        self.after = after
+        self.data_dir = data_dir
+        self.today = today or date.today
+
+        self.store = TideStore()
+        self.months: List[date] = []
+        self.last_refresh: datetime | None = None       # when the store was last swapped
+        self.load_seconds: float | None = None          # how long that load took
+        self.refreshes = 0
+
+        self._signature = None
+        self._lock = asyncio.Lock()
+        self._listeners: List[Callable[[TideStore], Awaitable[None]]] = []
+
+    def signature(self, months: List[date]) -> tuple:
+        '''
+        The months to load and the modified time of every data file in them - a change in either needs a reload.
+        '''
+        files = []
+
+        for month in months:
+            for spot in SPOTS:
+                for path in month_files(month, spot.id, self.data_dir):
+                    if os.path.exists(path):
+                        files.append((path, os.stat(path).st_mtime_ns))
+
+        return (tuple(months), tuple(files))
+
+    def on_refresh(self, callback: Callable[[TideStore], Awaitable[None]]) -> None:
+        '''
+        Registers a coroutine function to be awaited with the new store after every swap.
+        '''
+        self._listeners.append(callback)
+
+    async def refresh(self, force: bool = False) -> bool:
+        '''
+        Loads the current (and next) month's data off the event loop and swaps it in.
+
+        Parameters:
+            force (bool): reload even if nothing changed on disk
+
+        Returns:
+            bool: whether a new store was swapped in
+        '''
+        async with self._lock:
+            months = months_around(self.today(), self.before, self.after)
+            signature = await asyncio.to_thread(self.signature, months)
+
+            if not force and signature == self._signature:
+                return False
+
+            start = time.perf_counter()
+            store = await asyncio.to_thread(TideStore.load, months, self.data_dir)
+
+            # the swap - anyone holding the old store keeps using it until they're done
+            self.store = store
+            self.months = months
+            self._signature = signature
+            self.load_seconds = time.perf_counter() - start
+            self.last_refresh = datetime.now()
+            self.refreshes += 1
+
+            print(f'[tide_store.py] >>> Loaded {len(store)} tides for {", ".join(m.strftime("%m/%y") for m in months)} in {self.load_seconds * 1000:.1f}ms')
+
+        for callback in self._listeners:
+            try:
+                await callback(store)
+            except Exception as e:
+                print(f'[tide_store.py] >>> Refresh listener failed: {e}')
+
+        return True
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'tides':            len(self.store),
+            'months':           [m.isoformat() for m in self.months],
+            'last_refresh':     self.last_refresh.isoformat() if self.last_refresh else None,
+            'load_seconds':     self.load_seconds,
+            'refreshes':        self.refreshes,
+        }
@@ -0,0 +1,226 @@
+# Caches the weather of every spot, so a burst of requests for the same beach costs one weatherapi.com call
+
+### IMPORTS
+import asyncio
+import time
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+from data import local_today
+from weather import get_weather
+from weather.get_weather import WeatherClient
+
+### CONSTANTS
+TTL = 15 * 60               # seconds a forecast is fresh for
+STALE_TTL = 60 * 60         # seconds past its TTL a forecast is still served while a new one is fetched
+
+City = Tuple[float, float]
+
+
+class Forecast:
+    '''
+    The weather at a spot, from one forecast.json response.
+
+    Attributes:
+    - current: Tuple[int, str]
+        the current temperature and condition code
+
+    - days: List[Tuple[str, int, str]]
+        the date, average temperature and condition code of each day, today first
+
+    - fetched: float
+        when it was fetched (time.monotonic)
+
+    - fetched_on: date
+        the date at the beaches when it was fetched - its "current" weather is only current on that day
+    '''
+    def __init__(self, current: Tuple[int, str], days: List[Tuple[str, int, str]], fetched: float = None, fetched_on: date = None) -> None:
+        self.current = current
+        self.days = days
+        self.fetched = time.monotonic() if fetched is None else fetched
+        self.fetched_on = fetched_on or local_today()
+
+    @classmethod
+    def from_json(cls, data: dict, fetched_on: date = None) -> 'Forecast':
+        return cls(get_weather.parse_current(data), get_weather.parse_days(data), fetched_on=fetched_on)
+
+    def day(self, day: date) -> Tuple[int, str]:
+        '''
+        The average temperature and condition code forecast for a date.
+
+        Raises:
+            KeyError: if the forecast doesn't cover that date
+        '''
+        for forecast_date, temp, code in self.days:
+            if forecast_date == day.isoformat():
+                return (temp, code)
+
+        raise KeyError(f'No forecast for {day}')
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched
+
+
+class WeatherCache:
+    '''
+    Per-spot cache of weatherapi.com forecasts.
+
+    One forecast.json request serves the current weather, tomorrow's and the rest of the days.
+    - Fresh forecasts (younger than the TTL) are served straight from memory.
+    - Stale ones (up to STALE_TTL past it) are still served, while a new one is fetched in the background.
+    - Anything older, missing, or fetched on an earlier date is fetched - and requests for a spot that's already being fetched
+      wait on that same call. A forecast from before midnight would have yesterday's "tomorrow" in it.
+    '''
+    def __init__(self, client: WeatherClient = None, ttl: float = TTL, stale_ttl: float = STALE_TTL, today: Callable[[], date] = None) -> None:
+        '''
+        Parameters:
+            client (WeatherClient): the weatherapi.com client, defaults to the shared one
+            ttl (float): seconds a forecast is fresh for
+            stale_ttl (float): seconds past its TTL a forecast is still served while a new one is fetched
+            today (Callable[[], date]): returns today's date at the beaches
+        '''
+        self.client = client or get_weather.CLIENT
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.today = today or local_today
+
+        self._forecasts: Dict[City, Forecast] = {}
+        self._in_flight: Dict[City, asyncio.Task] = {}
+        self._listeners: List[Callable[[City, Forecast], Awaitable[None]]] = []
+
+        self.stats = {
+            'hits':         0,
+            'stale':        0,
+            'misses':       0,
+            'coalesced':    0,
+            'fetches':      0,
+            'failures':     0,
+        }
+
+    def on_update(self, callback: Callable[[City, Forecast], Awaitable[None]]) -> None:
+        '''
+        Registers a coroutine function to be awaited with the city and its new forecast after every fetch.
+        '''
+        self._listeners.append(callback)
+
+    async def _fetch(self, city: City) -> Forecast:
+        self.stats['fetches'] += 1
+
+        try:
+            forecast = Forecast.from_json(await self.client.forecast(city), self.today())
+        except Exception:
+            self.stats['failures'] += 1
+            raise
+        finally:
+            del self._in_flight[city]
+
+        self._forecasts[city] = forecast
+
+        for callback in self._listeners:
+            try:
+                await callback(city, forecast)
+            except Exception as e:
+                print(f'[cache.py] >>> Weather listener failed: {e}')
+
+        return forecast
+
+    def is_current(self, forecast: Forecast) -> bool:
+        '''
+        Whether a forecast was fetched today, at the beaches.
+        '''
+        return forecast.fetched_on == self.today()
+
+    def refresh(self, city: City) -> asyncio.Task:
+        '''
+        Starts fetching a new forecast for a city - or returns the fetch already running.
+        '''
+        task = self._in_flight.get(city)
+
+        if task is None:
+            task = asyncio.create_task(self._fetch(city))
+            self._in_flight[city] = task
+
+        return task
+
+    async def _revalidate(self, city: City) -> None:
+        try:
+            await self.refresh(city)
+        except Exception as e:
+            print(f'[cache.py] >>> Couldn\'t refresh the weather at {city}: {e}')
+
+    async def forecast(self, city: City) -> Forecast:
+        '''
+        Returns the forecast of a city, fetching it only if there's none recent enough.
+
+        Raises:
+            asyncio.TimeoutError / aiohttp.ClientError: if it had to be fetched and the request failed
+        '''
+        forecast = self._forecasts.get(city)
+
+        if forecast is not None and self.is_current(forecast):
+            age = forecast.age()
+
+            if age < self.ttl:
+                self.stats['hits'] += 1
+                return forecast
+
+            if age < self.ttl + self.stale_ttl:
+                self.stats['stale'] += 1
+                if city not in self._in_flight:
+                    asyncio.create_task(self._revalidate(city))
+                return forecast
+
+        if city in self._in_flight:
+            self.stats['coalesced'] += 1
+        else:
+            self.stats['misses'] += 1
+
+        # shielded so one cancelled request doesn't cancel the fetch for everyone else waiting on it
+        return await asyncio.shield(self.refresh(city))
+
+    def cached(self, city: City) -> Forecast | None:
+        '''
+        The forecast of a city if there's one from today that can still be served, without ever fetching one.
+        '''
+        forecast = self._forecasts.get(city)
+
+        if forecast is None or not self.is_current(forecast) or forecast.age() >= self.ttl + self.stale_ttl:
+            return None
+
+        return forecast
+
+    async def current(self, city: City) -> Tuple[int, str]:
+        '''
+        The current temperature and condition code at a city.
+        '''
+        return (await self.forecast(city)).current
+
+    async def tomorrow(self, city: City) -> Tuple[int, str]:
+        '''
+        Tomorrow's average temperature and condition code at a city.
+        '''
+        forecast = await self.forecast(city)
+        return forecast.day(forecast.fetched_on + timedelta(days=1))
+
+    async def warm(self, cities: Iterable[City]) -> None:
+        '''
+        Fetches the forecast of every city that isn't fresh yet, e.g. all the spots before pre-rendering their cards.
+        '''
+        async def warm_one(city: City) -> None:
+            forecast = self._forecasts.get(city)
+            if forecast is not None and forecast.age() < self.ttl and self.is_current(forecast):
+                return
+
+            try:
+                await self.refresh(city)
+            except Exception as e:
+                print(f'[cache.py] >>> Couldn\'t fetch the weather at {city}: {e}')
+
+        await asyncio.gather(*(warm_one(city) for city in cities))
+
+    def clear(self) -> None:
+        self._forecasts.clear()
+
+
+# Shared cache used by the bot
+WEATHER = WeatherCache()
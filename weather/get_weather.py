@@ -1,69 +1,205 @@
 # Gets the current weather at the given spot
 
 ### IMPORTS
-import requests
+import os
+import asyncio
+import aiohttp
 from datetime import datetime
-from typing import Tuple
-
-# Get API key from file
-API_KEY = ''
-with open('.weatherapi.key', 'r') as file:
-    API_KEY = file.read().strip()
-    print(API_KEY)
+from functools import lru_cache
+from typing import List, Tuple
 
 
 ### CONSTANTS
-WEATHERAPI = 'http://api.weatherapi.com/v1/current.json?key={}&q={},{}'
-WEATHERAPI_TMRW = 'http://api.weatherapi.com/v1/forecast.json?key={}&q={},{}&days=3'
+KEY_FILE = '.weatherapi.key'
+BASE_URL = os.environ.get('WEATHERAPI_URL', 'http://api.weatherapi.com/v1')     # overridable to point at a local stand-in
+WEATHERAPI = '{}/current.json?key={}&q={},{}'
+WEATHERAPI_TMRW = '{}/forecast.json?key={}&q={},{}&days=3'
+
+TIMEOUT = 5             # seconds allowed for a single weatherapi.com call
+POOL_SIZE = 10          # max open connections to weatherapi.com
+KEEPALIVE = 60          # seconds an idle connection is kept around for reuse
 
 ###### HELPERS #################################################
+# Get API key - from the WEATHERAPI_KEY environment variable or the key file, read on the first call rather than on import
+@lru_cache(maxsize=1)
+def api_key() -> str:
+    if os.environ.get('WEATHERAPI_KEY'):
+        return os.environ['WEATHERAPI_KEY']
+
+    with open(KEY_FILE, 'r') as file:
+        return file.read().strip()
+
 # Gets the URL to the icon from weatherapi.com and extracts only the 3 digit icon code
 def get_code_from_json(forecast) -> str:
     code = forecast['condition']['icon'][-7:-4]
     return code
 
+# Extracts the current temperature and condition from a current.json response
+def parse_current(data: dict) -> Tuple[int, str]:
+    weather = data['current']
+
+    temp = int(weather['temp_c'])
+    condition = get_code_from_json(weather)
+
+    return (temp, condition)
+
+# Extracts tomorrow's average temperature and condition from a forecast.json response
+def parse_tomorrow(data: dict) -> Tuple[int, str]:
+    weather = data['forecast']['forecastday'][1]['day']
+
+    temp = int(weather['avgtemp_c'])
+    condition = get_code_from_json(weather)
+
+    return (temp, condition)
+
+# Extracts every day's average temperature and condition from a forecast.json response - today first
+def parse_days(data: dict) -> List[Tuple[str, int, str]]:
+    days = []
+
+    for forecast in data['forecast']['forecastday']:
+        weather = forecast['day']
+        days.append((forecast['date'], int(weather['avgtemp_c']), get_code_from_json(weather)))
+
+    return days
+
+
+###### ASYNC CLIENT #################################################
+class WeatherClient:
+    '''
+    Asyncio client for weatherapi.com.
+
+    All calls share one aiohttp session, so connections to the API are kept alive and reused between requests.
+    The session is created lazily on the first call, inside the running event loop.
+    '''
+    def __init__(self, timeout: float = TIMEOUT, pool_size: int = POOL_SIZE, base_url: str = BASE_URL) -> None:
+        self.base_url = base_url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=KEEPALIVE, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        return self._session
+
+    async def get_json(self, url: str, timeout: float = None) -> dict:
+        '''
+        Fetches a weatherapi.com URL and returns the decoded JSON.
+
+        Parameters:
+            url (str): The full request URL
+            timeout (float): Seconds allowed for this call, defaults to the client's timeout
+
+        Raises:
+            asyncio.TimeoutError: if the API takes longer than the timeout
+            aiohttp.ClientError: if the request fails
+        '''
+        session = self._get_session()
+        call_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+
+        async with session.get(url, timeout=call_timeout) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def current_weather(self, city: Tuple[float, float], timeout: float = None) -> Tuple[int, str]:
+        '''
+        Fetches the current air temperature in ºC and the weather condition from weatherapi.com
+
+        Parameters:
+            city (Tuple[float, float]): The latitude and longitude of the location
+            timeout (float): Seconds allowed for this call
+
+        Returns:
+            Tuple[int, str]: The current temperature and the weather condition code
+        '''
+        data = await self.get_json(WEATHERAPI.format(self.base_url, api_key(), city[0], city[1]), timeout)
+        return parse_current(data)
+
+    async def tomorrow_weather(self, city: Tuple[float, float], timeout: float = None) -> Tuple[int, str]:
+        '''
+        Fetches tomorrow's air temperature in ºC and the weather condition from weatherapi.com
+
+        Parameters:
+            city (Tuple[float, float]): The latitude and longitude of the location
+            timeout (float): Seconds allowed for this call
+
+        Returns:
+            Tuple[int, str]: Tomorrow's temperature and the weather condition code
+        '''
+        data = await self.get_json(WEATHERAPI_TMRW.format(self.base_url, api_key(), city[0], city[1]), timeout)
+        return parse_tomorrow(data)
+
+    async def forecast(self, city: Tuple[float, float], timeout: float = None) -> dict:
+        '''
+        Fetches the 3 day forecast from weatherapi.com. The response has the current weather in it too.
+
+        Parameters:
+            city (Tuple[float, float]): The latitude and longitude of the location
+            timeout (float): Seconds allowed for this call
+
+        Returns:
+            dict: The decoded forecast.json response
+        '''
+        return await self.get_json(WEATHERAPI_TMRW.format(self.base_url, api_key(), city[0], city[1]), timeout)
+
+    async def close(self) -> None:
+        '''
+        Closes the shared session and every pooled connection.
+        '''
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+# Shared client used by the bot
+CLIENT = WeatherClient()
+
+
+###### SYNC WRAPPERS #################################################
+# Runs a single client call to completion, for scripts that aren't running an event loop
+def _run_once(method: str, city: Tuple[float, float]) -> Tuple[int, str]:
+    async def run():
+        client = WeatherClient()
+        try:
+            return await getattr(client, method)(city)
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
 # Get current weather at given location
-def current_weather(city: Tuple[float, float]) -> Tuple[int, int]:
+def current_weather(city: Tuple[float, float]) -> Tuple[int, str]:
     '''
     Fetches the current air temperature in ºC and the weather condition from weatherapi.com
 
+    Blocking wrapper around WeatherClient.current_weather - don't call this from inside the bot's event loop.
+
     Parameters:
         city (Tuple[float, float]): The latitude and longitude of the location
 
     Returns:
-        Tuple[int, int]: The current temperature and the weather condition code
+        Tuple[int, str]: The current temperature and the weather condition code
     '''
-    response = requests.get(WEATHERAPI.format(API_KEY, city[0], city[1]))
-    data = response.json()
-    weather = data['current']
-
-    temp = int(data['current']['temp_c'])
-    condition = get_code_from_json(weather)
-
-    return (temp, condition)
+    return _run_once('current_weather', city)
 
 # Get tomorrow's weather
-def tomorrow_weather(city: Tuple[float, float]) -> Tuple[int, int]:
+def tomorrow_weather(city: Tuple[float, float]) -> Tuple[int, str]:
     '''
     Fetches the tomorrow's air temperature in ºC and the weather condition from weatherapi.com
 
+    Blocking wrapper around WeatherClient.tomorrow_weather - don't call this from inside the bot's event loop.
+
     Parameters:
         city (Tuple[float, float]): The latitude and longitude of the location
 
     Returns:
-        Tuple[int, int]: The tomorrow's temperature and the weather condition code
+        Tuple[int, str]: The tomorrow's temperature and the weather condition code
     '''
-    response = requests.get(WEATHERAPI_TMRW.format(API_KEY, city[0], city[1]))
-    data = response.json()
-    weather = data['forecast']['forecastday'][1]['day']
-
-    temp = int(weather['avgtemp_c'])
-    condition = get_code_from_json(weather)
-
-    return (temp, condition)
+    return _run_once('tomorrow_weather', city)
 
 if __name__ == '__main__':
     x = current_weather((39.756, -9.033))
     print(x)
     y = tomorrow_weather((39.756, -9.033))
-    print(y)
\ No newline at end of file
+    print(y)